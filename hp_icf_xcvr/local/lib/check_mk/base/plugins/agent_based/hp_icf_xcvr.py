@@ -10,12 +10,16 @@
 from dataclasses import dataclass, field
 import pprint
 import math
+import time
 from typing import (
     Dict,
     List,
     NamedTuple,
     Sequence,
+    Set,
+    Tuple,
     Mapping,
+    Optional,
     Callable,
     Any,
 )
@@ -30,6 +34,7 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     contains,
     register,
     check_levels,
+    get_value_store,
     render,
     OIDEnd,
     Result,
@@ -41,22 +46,21 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
 from cmk.base.plugins.agent_based.utils import interfaces
 
 
-def parse_alarm_level(level: str, divisor: float = 1000.0) -> float:
-    if not level:
-        return None
-    if level == "0":
-        return None
-    return float(level) / divisor
+# The SNMP columns are converted as a whole instead of calling a conversion
+# function for every single value. A missing or "0" threshold becomes None.
 
 
-def parse_value(value: str, divisor: float = 1000.0) -> float:
-    return float(value) / divisor
+def _value_column(rows: StringTable, column: int, divisor: float = 1000.0) -> List[float]:
+    return [float(line[column]) / divisor for line in rows]
 
 
-def _dbm_to_uw(dbm):
-    if dbm == "-99999999":
-        return 0
-    return pow(10, (float(dbm) - 30.0) / 10.0) * 1000000.0
+def _level_column(rows: StringTable, column: int, divisor: float = 1000.0) -> List[float]:
+    return [float(line[column]) / divisor if line[column] and line[column] != "0" else None for line in rows]
+
+
+def _dbm_to_uw_column(dbm: List[float]) -> List[float]:
+    # -99999.999 dBm (no light) underflows to 0 µW
+    return [pow(10, (value - 30.0) / 10.0) * 1000000.0 for value in dbm]
 
 
 def _uw_to_dbm(uw):
@@ -65,79 +69,209 @@ def _uw_to_dbm(uw):
     return 10 * math.log10(uw / 1000000.0) + 30
 
 
+def _render_temperature(value: float) -> str:
+    return "%.2f °C" % value
+
+
+def _render_voltage(value: float) -> str:
+    return "%.3f V" % value
+
+
+def _render_current(value: float) -> str:
+    return "%.3f mA" % value
+
+
+def _render_power(value: float) -> str:
+    return "%.3f µW (%.3f dBm)" % (value, _uw_to_dbm(value))
+
+
+_NO_LEVELS = (None, None)
+
+
+def _levels(warn: float, crit: float) -> Tuple[float, float]:
+    # most optics lack some thresholds, share one tuple for them
+    if warn is None and crit is None:
+        return _NO_LEVELS
+    return (warn, crit)
+
+
+# Sections are cached for many ports, so the records are tuples (no
+# per-instance __dict__) and share the module-level render functions.
 class Measurement(NamedTuple):
     value: float
-    levels_lower: float = None
-    levels_upper: float = None
+    levels_lower: Tuple[float, float] = None
+    levels_upper: Tuple[float, float] = None
     render_func: Callable[[float], str] = None
 
 
-@dataclass
-class SectionItem:
-    supports_dom: bool = False
-    index: str = ''
-    descr: str = ''
-    type: str = ''
-    oper_status: str = ''
-    values: Dict[str, Measurement] = field(default_factory=dict)
+# name, value column (hp_icf_xcvr_table) and divisor, value in dBm,
+# threshold columns (hp_icf_xcvr_thresholds: lower warn/crit, upper warn/crit) and divisor, render function
+_MEASUREMENTS = (
+    ("Temperature", 3, 1000.0, False, (6, 4, 5, 3), 1000.0, _render_temperature),
+    ("SupplyVoltage", 4, 10000.0, False, (10, 8, 9, 7), 10000.0, _render_voltage),
+    ("TxBiasCurrent", 5, 1000.0, False, (14, 12, 13, 11), 1000.0, _render_current),
+    ("TxOutputPower", 6, 1000.0, True, (18, 16, 17, 15), 10.0, _render_power),
+    ("RxOpticalPower", 7, 1000.0, True, (22, 20, 21, 19), 10.0, _render_power),
+)
+
+
+class Thresholds(NamedTuple):
+    model: str
+    levels: Dict[str, Tuple[Tuple[float, float], Tuple[float, float]]]
+
+
+ThresholdsSection = Dict[str, Thresholds]
+
+
+class SectionItem(NamedTuple):
+    supports_dom: bool
+    index: str
+    descr: str
+    type: str
+    oper_status: str
+    values: Dict[str, Measurement]
+
+
+def saveint(i: Any) -> int:
+    try:
+        return int(i)
+    except (TypeError, ValueError):
+        return 0
 
 
-Section = Dict[str, SectionItem]
+@dataclass
+class Section:
+    """DOM measurements by port index (the ifIndex of the transceiver port)
+
+    The interface data is not fetched by this section but taken from the
+    interfaces section of the core, which is walked anyway, the levels are
+    taken from the hp_icf_xcvr_thresholds section. join() combines them once
+    per parsed section and builds lookups of the service items:
+    An item matches a transceiver if it is the interface index with or without
+    leading zeros (all zeros match index 0), the description or alias, or
+    "<description> <index>". by_index is keyed by the index, by_name by the
+    other forms.
+
+    Whether a port has any nonzero reading is decided at parse time, the
+    interfaces offered to the discovery are built once per join.
+    """
+    measurements: Dict[str, Dict[str, Measurement]] = field(default_factory=dict)
+    models: Dict[str, str] = field(default_factory=dict)
+    with_readings: Set[str] = field(default_factory=set)
+    transceivers: Dict[str, SectionItem] = field(default_factory=dict)
+    by_index: Dict[str, List[str]] = field(default_factory=dict)
+    by_name: Dict[str, List[str]] = field(default_factory=dict)
+    joined_sections: Tuple[Any, Any] = field(default=(None, None), repr=False)
+    discovered: Optional[List[interfaces.Interface]] = field(default=None, repr=False)
+
+    def join(
+        self,
+        section_interfaces: interfaces.Section,
+        section_thresholds: Optional[ThresholdsSection],
+    ) -> None:
+        if self.joined_sections[0] is section_interfaces and self.joined_sections[1] is section_thresholds:
+            return
+        self.transceivers, self.by_index, self.by_name = {}, {}, {}
+        self.discovered = None
+        interface_map = {interface.index: interface for interface in section_interfaces}
+        for port_index, values in self.measurements.items():
+            interface = interface_map.get(port_index)
+            if interface is None:
+                continue
+            thresholds = (section_thresholds or {}).get(port_index)
+            # The thresholds are cached much longer than the readings. If the
+            # optic has been replaced since, they belong to the old one.
+            if thresholds is not None and thresholds.model == self.models[port_index]:
+                values = {
+                    name: Measurement(measurement.value, *thresholds.levels[name], measurement.render_func)
+                    for name, measurement in values.items()
+                }
+            self.add(port_index, SectionItem(
+                supports_dom=True,
+                index=str(interface.index),
+                descr=str(interface.descr),
+                type=str(interface.type),
+                oper_status=str(interface.oper_status),
+                values=values,
+            ))
+        self.joined_sections = (section_interfaces, section_thresholds)
+
+    def add(self, key: str, section_item: SectionItem) -> None:
+        self.transceivers[key] = section_item
+        index_keys = {section_item.index}
+        if saveint(section_item.index) == 0:
+            index_keys.add("")
+        for index_key in index_keys:
+            self.by_index.setdefault(index_key, []).append(key)
+        for name_key in {section_item.descr, "%s %s" % (section_item.descr, section_item.index)}:
+            self.by_name.setdefault(name_key, []).append(key)
+
+    def discovery_interfaces(self) -> List[interfaces.Interface]:
+        if self.discovered is None:
+            self.discovered = [
+                interfaces.Interface(
+                    index=section_item.index,
+                    descr=section_item.descr,
+                    type=section_item.type,
+                    oper_status=section_item.oper_status,
+                    alias=section_item.descr,
+                )
+                for key, section_item in self.transceivers.items()
+                if section_item.supports_dom and key in self.with_readings
+            ]
+        return self.discovered
 
+    def find(self, item: str) -> List[SectionItem]:
+        keys = self.by_index.get(item.lstrip("0"), []) + self.by_name.get(item, [])
+        if len(keys) > 1:
+            # rare: several matches, keep the order of the section
+            matches = set(keys)
+            keys = [key for key in self.transceivers if key in matches]
+        return [self.transceivers[key] for key in keys]
 
-def parse_hp_icf_xcvr_table(string_table: List[StringTable]) -> Section:
+
+def parse_hp_icf_xcvr_table(string_table: StringTable) -> Section:
     # pprint.pprint(string_table)
-    interface_map: Dict[str, List[str]] = {}
-    for line in string_table[0]:
-        interface_map[line[0]] = line[1:]
-
-    result = {}
-    for line in string_table[1]:
-        # The value of this object is valid when the value of the hpicfXcvrDiagnostics object is dom(1).
-        if line[2] != "1":
-            continue
-
-        interface = interface_map[line[0]]
-        section_item = SectionItem(
-            supports_dom=line[2] == "1",
-            index=str(interface[0]),
-            descr=str(interface[1]),
-            type=str(interface[2]),
-            oper_status=str(interface[3]),
-        )
-        values: Dict[str, Measurement] = {}
-
-        values["Temperature"] = Measurement(
-            parse_value(line[3]),
-            (parse_alarm_level(line[11]), parse_alarm_level(line[9])),
-            (parse_alarm_level(line[10]), parse_alarm_level(line[8])),
-            lambda v: "%.2f °C" % v)
-        values["SupplyVoltage"] = Measurement(
-            parse_value(line[4], divisor=10000),
-            (parse_alarm_level(line[15], divisor=10000), parse_alarm_level(line[13], divisor=10000)),
-            (parse_alarm_level(line[14], divisor=10000), parse_alarm_level(line[12], divisor=10000)),
-            lambda v: "%.3f V" % v)
-        values["TxBiasCurrent"] = Measurement(
-            parse_value(line[5]),
-            (parse_alarm_level(line[19]), parse_alarm_level(line[17])),
-            (parse_alarm_level(line[18]), parse_alarm_level(line[16])),
-            lambda v: "%.3f mA" % v)
-        values["TxOutputPower"] = Measurement(
-            _dbm_to_uw(parse_value(line[6])),
-            (parse_alarm_level(line[23], divisor=10.0), parse_alarm_level(line[21], divisor=10.0)),
-            (parse_alarm_level(line[22], divisor=10.0), parse_alarm_level(line[20], divisor=10.0)),
-            lambda v: "%.3f µW (%.3f dBm)" % (v, _uw_to_dbm(v)))
-        values["RxOpticalPower"] = Measurement(
-            _dbm_to_uw(parse_value(line[7])),
-            (parse_alarm_level(line[27], divisor=10.0), parse_alarm_level(line[25], divisor=10.0)),
-            (parse_alarm_level(line[26], divisor=10.0), parse_alarm_level(line[24], divisor=10.0)),
-            lambda v: "%.3f µW (%.3f dBm)" % (v, _uw_to_dbm(v)))
-        section_item.values = values
-        result[line[0]] = section_item
+    # The value of this object is valid when the value of the hpicfXcvrDiagnostics object is dom(1).
+    rows = [line for line in string_table if line[2] == "1"]
+
+    measurements: Dict[str, List[Measurement]] = {}
+    with_readings = [False] * len(rows)
+    for name, column, divisor, dbm, _level_columns, _level_divisor, render_func in _MEASUREMENTS:
+        values = _value_column(rows, column, divisor)
+        if dbm:
+            values = _dbm_to_uw_column(values)
+        measurements[name] = [Measurement(value, _NO_LEVELS, _NO_LEVELS, render_func) for value in values]
+        with_readings = [any_reading or value != 0.0 for any_reading, value in zip(with_readings, values)]
+
+    result = Section()
+    result.with_readings = {line[0] for line, any_reading in zip(rows, with_readings) if any_reading}
+    for row_index, line in enumerate(rows):
+        result.measurements[line[0]] = {name: measurements[name][row_index] for name in measurements}
+        result.models[line[0]] = line[1]
     # pprint.pprint(result)
     return result
 
 
+def parse_hp_icf_xcvr_thresholds(string_table: StringTable) -> ThresholdsSection:
+    rows = [line for line in string_table if line[2] == "1"]
+
+    levels: Dict[str, List[Tuple[Tuple[float, float], Tuple[float, float]]]] = {}
+    for name, _column, _divisor, _dbm, level_columns, level_divisor, _render_func in _MEASUREMENTS:
+        lower_warn, lower_crit, upper_warn, upper_crit = (
+            _level_column(rows, level_column, level_divisor) for level_column in level_columns
+        )
+        levels[name] = [
+            (_levels(low_warn, low_crit), _levels(up_warn, up_crit))
+            for low_warn, low_crit, up_warn, up_crit in zip(lower_warn, lower_crit, upper_warn, upper_crit)
+        ]
+
+    return {
+        line[0]: Thresholds(line[1], {name: levels[name][row_index] for name in levels})
+        for row_index, line in enumerate(rows)
+    }
+
+
 register.snmp_section(
     name="hp_icf_xcvr_table",
     detect=all_of(
@@ -146,120 +280,242 @@ register.snmp_section(
     ),
     parse_function=parse_hp_icf_xcvr_table,
     parsed_section_name="hp_icf_xcvr_table",
-    fetch=[
-        SNMPTree(
-            base=".1.3.6.1.2.1.2.2.1",
-            oids=[
-                OIDEnd(),
-                "1",  # ifIndex
-                "2",  # ifDescr
-                "3",  # ifType
-                "8",  # ifOperStatus
-            ]
-        ),
-        SNMPTree(
-            base=".1.3.6.1.4.1.11.2.14.11.5.1.82.1.1.1.1",
-            oids=[
-                '1',  # hpicfXcvrPortIndex
-                '3',  # hpicfXcvrModel
-                '9',  # hpicfXcvrDiagnostics
-                '11',  # hpicfXcvrTemp
-                '12',  # hpicfXcvrVoltage
-                '13',  # hpicfXcvrBias
-                '14',  # hpicfXcvrTxPower
-                '15',  # hpicfXcvrRxPower
-                '18',  # hpicfXcvrTempHiAlarm
-                '19',  # hpicfXcvrTempLoAlarm
-                '20',  # hpicfXcvrTempHiWarn
-                '21',  # hpicfXcvrTempLoWarn
-                '22',  # hpicfXcvrVccHiAlarm
-                '23',  # hpicfXcvrVccLoAlarm
-                '24',  # hpicfXcvrVccHiWarn
-                '25',  # hpicfXcvrVccLoWarn
-                '26',  # hpicfXcvrBiasHiAlarm
-                '27',  # hpicfXcvrBiasLoAlarm
-                '28',  # hpicfXcvrBiasHiWarn
-                '29',  # hpicfXcvrBiasLoWarn
-                '30',  # hpicfXcvrPwrOutHiAlarm
-                '31',  # hpicfXcvrPwrOutLoAlarm
-                '32',  # hpicfXcvrPwrOutHiWarn
-                '33',  # hpicfXcvrPwrOutLoWarn
-                '34',  # hpicfXcvrRcvPwrHiAlarm
-                '35',  # hpicfXcvrRcvPwrLoAlarm
-                '36',  # hpicfXcvrRcvPwrHiWarn
-                '37',  # hpicfXcvrRcvPwrLoWarn
-            ]
-        ),
-    ],
+    # The ifTable is not walked here, see Section.join
+    fetch=SNMPTree(
+        base=".1.3.6.1.4.1.11.2.14.11.5.1.82.1.1.1.1",
+        oids=[
+            '1',  # hpicfXcvrPortIndex
+            '3',  # hpicfXcvrModel
+            '9',  # hpicfXcvrDiagnostics
+            '11',  # hpicfXcvrTemp
+            '12',  # hpicfXcvrVoltage
+            '13',  # hpicfXcvrBias
+            '14',  # hpicfXcvrTxPower
+            '15',  # hpicfXcvrRxPower
+        ]
+    ),
+)
+
+
+# The factory thresholds do not change while an optic is plugged in. Configure
+# a long interval for this section with the rule "Fetch intervals for SNMP
+# sections" to walk them far less often than the readings above.
+register.snmp_section(
+    name="hp_icf_xcvr_thresholds",
+    detect=all_of(
+        contains(".1.3.6.1.2.1.1.1.0", "hp"),
+        exists(".1.3.6.1.4.1.11.2.14.11.5.1.82.1.1.1.1.9.*"),
+    ),
+    parse_function=parse_hp_icf_xcvr_thresholds,
+    fetch=SNMPTree(
+        base=".1.3.6.1.4.1.11.2.14.11.5.1.82.1.1.1.1",
+        oids=[
+            '1',  # hpicfXcvrPortIndex
+            '3',  # hpicfXcvrModel
+            '9',  # hpicfXcvrDiagnostics
+            '18',  # hpicfXcvrTempHiAlarm
+            '19',  # hpicfXcvrTempLoAlarm
+            '20',  # hpicfXcvrTempHiWarn
+            '21',  # hpicfXcvrTempLoWarn
+            '22',  # hpicfXcvrVccHiAlarm
+            '23',  # hpicfXcvrVccLoAlarm
+            '24',  # hpicfXcvrVccHiWarn
+            '25',  # hpicfXcvrVccLoWarn
+            '26',  # hpicfXcvrBiasHiAlarm
+            '27',  # hpicfXcvrBiasLoAlarm
+            '28',  # hpicfXcvrBiasHiWarn
+            '29',  # hpicfXcvrBiasLoWarn
+            '30',  # hpicfXcvrPwrOutHiAlarm
+            '31',  # hpicfXcvrPwrOutLoAlarm
+            '32',  # hpicfXcvrPwrOutHiWarn
+            '33',  # hpicfXcvrPwrOutLoWarn
+            '34',  # hpicfXcvrRcvPwrHiAlarm
+            '35',  # hpicfXcvrRcvPwrLoAlarm
+            '36',  # hpicfXcvrRcvPwrHiWarn
+            '37',  # hpicfXcvrRcvPwrLoWarn
+        ]
+    ),
 )
 
 
 def discovery_hp_icf_xcvr_table(
     params: Sequence[Mapping[str, Any]],
-    section: Section
+    section_hp_icf_xcvr_table: Optional[Section],
+    section_hp_icf_xcvr_thresholds: Optional[ThresholdsSection],
+    section_interfaces: Optional[interfaces.Section],
 ) -> DiscoveryResult:
-    items = []
-    for item, section_item in section.items():
-        any_measurement = any([measurement.value != 0.0 for measurement in section_item.values.values()])
-
-        if section_item.supports_dom and any_measurement:
-            items.append(interfaces.Interface(
-                index=section_item.index,
-                descr=section_item.descr,
-                type=section_item.type,
-                oper_status=section_item.oper_status,
-                alias=section_item.descr,
-            )
-            )
+    if section_hp_icf_xcvr_table is None or section_interfaces is None:
+        return
+    section_hp_icf_xcvr_table.join(section_interfaces, section_hp_icf_xcvr_thresholds)
+
     yield from interfaces.discover_interfaces(
         params,
-        items,
+        section_hp_icf_xcvr_table.discovery_interfaces(),
     )
 
 
-def saveint(i: Any) -> int:
-    try:
-        return int(i)
-    except (TypeError, ValueError):
-        return 0
+# Power degrades roughly linearly in dB, so its trend is computed in dBm.
+# name: (scale function, render function of the scaled values, unit of the slope)
+_TRENDS = {
+    "RxOpticalPower": (_uw_to_dbm, lambda value: "%.3f dBm" % value, "dB"),
+    "TxOutputPower": (_uw_to_dbm, lambda value: "%.3f dBm" % value, "dB"),
+    "TxBiasCurrent": (lambda value: value, _render_current, "mA"),
+}
+
+_TREND_MIN_SAMPLES = 3
+
+
+def _trend_update(
+    value_store: Any,
+    key: str,
+    now: float,
+    value: float,
+    width: float,
+    size: int,
+) -> List[Tuple[float, float]]:
+    """Add a reading to the history of key, return the samples oldest first
+
+    The history is a ring buffer of the averages of up to size buckets of
+    width seconds, stored as a tuple of plain values:
+    (bucket start, bucket sum, bucket count, next slot, start times, averages)
+    The running bucket is returned as the last sample.
+    """
+    bucket_start, bucket_sum, bucket_count, next_slot, times, averages = value_store.get(
+        key, (now, 0.0, 0, 0, [], []))
+
+    if len(times) != size:
+        # Not full yet, or the number of samples has been changed: keep the
+        # samples oldest first, so the next one is appended after the newest
+        times = (times[next_slot:] + times[:next_slot])[-size:]
+        averages = (averages[next_slot:] + averages[:next_slot])[-size:]
+        next_slot = len(times) % size
+
+    if not bucket_start <= now < bucket_start + width:
+        if bucket_count:
+            if len(times) < size:
+                times.append(int(bucket_start))
+                averages.append(bucket_sum / bucket_count)
+            else:
+                times[next_slot] = int(bucket_start)
+                averages[next_slot] = bucket_sum / bucket_count
+            next_slot = (next_slot + 1) % size
+        bucket_start, bucket_sum, bucket_count = now, 0.0, 0
+
+    bucket_sum += value
+    bucket_count += 1
+    value_store[key] = (bucket_start, bucket_sum, bucket_count, next_slot, times, averages)
+
+    # Samples older than the history (after a long outage) are dropped.
+    oldest = now - width * size
+    samples = [
+        (sample_time, average)
+        for sample_time, average in zip(times[next_slot:] + times[:next_slot], averages[next_slot:] + averages[:next_slot])
+        if sample_time >= oldest
+    ]
+    samples.append((bucket_start, bucket_sum / bucket_count))
+    return samples
+
+
+def _trend_fit(samples: List[Tuple[float, float]]) -> Tuple[float, float, float]:
+    """Least squares fit, returns mean time, mean value and slope per second"""
+    mean_time = sum(sample_time for sample_time, _average in samples) / len(samples)
+    mean_value = sum(average for _sample_time, average in samples) / len(samples)
+    variance = sum((sample_time - mean_time) ** 2 for sample_time, _average in samples)
+    if variance == 0:
+        return mean_time, mean_value, 0.0
+    covariance = sum((sample_time - mean_time) * (average - mean_value) for sample_time, average in samples)
+    return mean_time, mean_value, covariance / variance
+
+
+def _check_trend(
+    value_store: Any,
+    key: str,
+    measurement: Measurement,
+    params: Mapping[str, Any],
+    now: float,
+) -> CheckResult:
+    scale, render_scaled, slope_unit = _TRENDS[key]
+    value = scale(measurement.value)
+    if math.isinf(value):  # no light
+        return
+
+    size = params["trend_samples"]
+    width = params["trend_range"] * 3600.0 / size
+    samples = _trend_update(value_store, f"trend.{key}", now, value, width, size)
+    if len(samples) < _TREND_MIN_SAMPLES:
+        return
+
+    mean_time, mean_value, slope = _trend_fit(samples)
+    yield Result(
+        state=State.OK,
+        notice=f"{key} trend: %s average, %+.3f %s per hour" % (render_scaled(mean_value), slope * 3600, slope_unit),
+    )
+
+    # Time until the fitted line crosses the threshold it is heading for
+    if slope < 0:
+        levels = measurement.levels_lower
+    elif slope > 0:
+        levels = measurement.levels_upper
+    else:
+        return
+    threshold = levels[1] if levels[1] is not None else levels[0]
+    if threshold is None or not threshold > 0:
+        return
+    time_left = (scale(threshold) - (mean_value + slope * (now - mean_time))) / slope
+    if time_left <= 0:  # already crossed, reported by the levels above
+        return
+    warn, crit = params["trend_timeleft"]
+    yield from check_levels(
+        value=time_left,
+        levels_lower=(warn * 3600.0, crit * 3600.0),
+        render_func=render.timespan,
+        label=f"{key} threshold reached in",
+        notice_only=True,
+    )
 
 
-def item_matches(
+def check_hp_icf_xcvr_table(
     item: str,
-    ifIndex: str,
-    ifAlias: str,
-    ifDescr: str,
-) -> bool:
-    return item.lstrip("0") == ifIndex \
-        or (item == "0" * len(item) and saveint(ifIndex) == 0) \
-        or item == ifAlias \
-        or item == ifDescr \
-        or item == "%s %s" % (ifAlias, ifIndex) \
-        or item == "%s %s" % (ifDescr, ifIndex)
-
-
-def check_hp_icf_xcvr_table(item, section):
-    for _, section_item in section.items():
-        if item_matches(item, section_item.index, section_item.descr, section_item.descr):
-            for key in sorted(section_item.values):
-                value, levels_lower, levels_upper, render_func = section_item.values[key]
-                yield from check_levels(value=value, levels_upper=levels_upper, levels_lower=levels_lower, metric_name=key, render_func=render_func, label=key)
-                if levels_lower:
-                    lower_warn = "never" if levels_lower[0] is None else render_func(levels_lower[0])
-                    lower_crit = "never" if levels_lower[1] is None else render_func(levels_lower[1])
-                    yield Result(state=State.OK, notice=f"{key}: (warn/crit below %s/%s)" % (lower_warn, lower_crit))
-                if levels_upper:
-                    upper_warn = "never" if levels_upper[0] is None else render_func(levels_upper[0])
-                    upper_crit = "never" if levels_upper[1] is None else render_func(levels_upper[1])
-                    yield Result(state=State.OK, notice=f"{key}: (warn/crit at %s/%s)" % (upper_warn, upper_crit))
+    params: Mapping[str, Any],
+    section_hp_icf_xcvr_table: Optional[Section],
+    section_hp_icf_xcvr_thresholds: Optional[ThresholdsSection],
+    section_interfaces: Optional[interfaces.Section],
+) -> CheckResult:
+    if section_hp_icf_xcvr_table is None or section_interfaces is None:
+        return
+    section_hp_icf_xcvr_table.join(section_interfaces, section_hp_icf_xcvr_thresholds)
+
+    value_store = get_value_store()
+    now = time.time()
+    for section_item in section_hp_icf_xcvr_table.find(item):
+        for key in sorted(section_item.values):
+            value, levels_lower, levels_upper, render_func = section_item.values[key]
+            yield from check_levels(value=value, levels_upper=levels_upper, levels_lower=levels_lower, metric_name=key, render_func=render_func, label=key)
+            if levels_lower:
+                lower_warn = "never" if levels_lower[0] is None else render_func(levels_lower[0])
+                lower_crit = "never" if levels_lower[1] is None else render_func(levels_lower[1])
+                yield Result(state=State.OK, notice=f"{key}: (warn/crit below %s/%s)" % (lower_warn, lower_crit))
+            if levels_upper:
+                upper_warn = "never" if levels_upper[0] is None else render_func(levels_upper[0])
+                upper_crit = "never" if levels_upper[1] is None else render_func(levels_upper[1])
+                yield Result(state=State.OK, notice=f"{key}: (warn/crit at %s/%s)" % (upper_warn, upper_crit))
+            if key in _TRENDS:
+                yield from _check_trend(value_store, key, section_item.values[key], params, now)
 
 
 register.check_plugin(
     name="hp_icf_xcvr_table",
     service_name='SFP %s',
+    sections=["hp_icf_xcvr_table", "hp_icf_xcvr_thresholds", "interfaces"],
     discovery_ruleset_name="inventory_if_rules",
     discovery_ruleset_type=register.RuleSetType.ALL,
     discovery_default_parameters=dict(interfaces.DISCOVERY_DEFAULT_PARAMETERS),
     discovery_function=discovery_hp_icf_xcvr_table,
     check_function=check_hp_icf_xcvr_table,
+    check_default_parameters={
+        "trend_range": 24,
+        "trend_samples": 24,
+        "trend_timeleft": (168, 48),
+    },
+    check_ruleset_name="hp_icf_xcvr",
 )
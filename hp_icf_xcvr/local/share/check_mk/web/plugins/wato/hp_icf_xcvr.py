@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8; py-indent-offset: 4 -*-
+
+#
+# (c) 2022 DECOIT GmbH
+#          Timo Klecker <klecker@decoit.de>
+# License: GNU General Public License v2
+#
+
+from cmk.gui.i18n import _
+from cmk.gui.valuespec import (
+    Dictionary,
+    Integer,
+    TextAscii,
+    Tuple,
+)
+
+from cmk.gui.plugins.wato import (
+    CheckParameterRulespecWithItem,
+    rulespec_registry,
+    RulespecGroupCheckParametersNetworking,
+)
+
+
+def _parameter_hp_icf_xcvr():
+    return Dictionary(
+        elements=[
+            ("trend_range",
+             Integer(
+                 title=_("Time range for the trend of optical power and bias current"),
+                 help=_("The trend is computed from the history of this time range."),
+                 unit=_("hours"),
+                 minvalue=1,
+                 default_value=24,
+             )),
+            ("trend_samples",
+             Integer(
+                 title=_("Number of samples kept for the trend"),
+                 help=_("The readings within the time range are averaged into this "
+                        "number of samples per measurement and port."),
+                 minvalue=3,
+                 maxvalue=288,
+                 default_value=24,
+             )),
+            ("trend_timeleft",
+             Tuple(
+                 title=_("Levels on the time left until a threshold of the transceiver is reached"),
+                 elements=[
+                     Integer(title=_("Warning if below"), unit=_("hours"), default_value=168),
+                     Integer(title=_("Critical if below"), unit=_("hours"), default_value=48),
+                 ],
+             )),
+        ],
+    )
+
+
+rulespec_registry.register(
+    CheckParameterRulespecWithItem(
+        check_group_name="hp_icf_xcvr",
+        group=RulespecGroupCheckParametersNetworking,
+        item_spec=lambda: TextAscii(title=_("Port"), allow_empty=False),
+        match_type="dict",
+        parameter_valuespec=_parameter_hp_icf_xcvr,
+        title=lambda: _("HP transceiver trend"),
+    ))
@@ -51,6 +51,28 @@ def _get_ovirt_plugin_config(conf: Dict[str, Any]) -> Iterable[str]:
         yield "engine_url=%s" % conf['engine_url']
     if "generate_piggyback" in conf:
         yield "generate_piggyback=%s" % conf['generate_piggyback']
+    if "max_workers" in conf:
+        yield "max_workers=%s" % conf['max_workers']
+    if "sso" in conf:
+        yield "sso=%s" % conf['sso']
+    if "persistent_auth" in conf:
+        yield "persistent_auth=%s" % conf['persistent_auth']
+    if "stream_vms" in conf:
+        yield "stream_vms=%s" % conf['stream_vms']
+    if "page_size" in conf:
+        yield "page_size=%s" % conf['page_size']
+    if "cache_ttl_clusters" in conf:
+        yield "cache_ttl_clusters=%s" % conf['cache_ttl_clusters']
+    if "cache_ttl_datacenters" in conf:
+        yield "cache_ttl_datacenters=%s" % conf['cache_ttl_datacenters']
+    if "connect_timeout" in conf:
+        yield "connect_timeout=%s" % conf['connect_timeout']
+    if "read_timeout" in conf:
+        yield "read_timeout=%s" % conf['read_timeout']
+    if "deadline" in conf:
+        yield "deadline=%s" % conf['deadline']
+    if "section_cache_max_age" in conf:
+        yield "section_cache_max_age=%s" % conf['section_cache_max_age']
 
 
 register.bakery_plugin(
@@ -19,7 +19,6 @@
 # to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
 # Boston, MA 02110-1301 USA.
 
-import json
 from typing import Dict, List
 from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     Metric,
@@ -31,11 +30,11 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     regex,
 )
 
+from cmk.base.plugins.agent_based.utils import ovirt
+
 
 def ovirt_overview_parse(string_table):
-    if string_table[0][0] != '@ovirt_version_info':
-        raise ValueError('Version Header required')
-    return json.loads(string_table[1][0])['api']
+    return ovirt.parse_document(string_table)['api']
 
 
 def ovirt_overview_host_label(section):
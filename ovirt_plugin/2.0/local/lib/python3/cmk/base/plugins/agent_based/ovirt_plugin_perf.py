@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8; py-indent-offset: 4 -*-
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+
+#
+# Ovirt Plugin
+# (c) 2021 DECOIT GmbH
+#
+
+#
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  Ovirt Plugin is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# ails.  You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+from typing import Any, Dict
+
+from cmk.base.plugins.agent_based.agent_based_api.v1.type_defs import (
+    CheckResult,
+    DiscoveryResult,
+)
+
+from cmk.base.plugins.agent_based.agent_based_api.v1 import (
+    check_levels,
+    Metric,
+    register,
+    render,
+    Result,
+    Service,
+    State,
+)
+
+from cmk.base.plugins.agent_based.utils import ovirt
+
+# The run of the plugin as a whole, the other items are the API endpoints
+TOTAL_ITEM = "Total"
+
+
+def ovirt_plugin_perf_parse(string_table) -> Dict[str, Any]:
+    return ovirt.parse_document(string_table)
+
+
+register.agent_section(
+    name="ovirt_plugin_perf",
+    parse_function=ovirt_plugin_perf_parse,
+)
+
+
+def discovery_ovirt_plugin_perf(section: Dict[str, Any]) -> DiscoveryResult:
+    yield Service(item=TOTAL_ITEM)
+    for endpoint in section.get("endpoints", {}):
+        yield Service(item=endpoint)
+
+
+def _check_total(params, section: Dict[str, Any]) -> CheckResult:
+    yield from check_levels(
+        value=section.get("elapsed", 0),
+        levels_upper=params.get("runtime"),
+        metric_name="ovirt_plugin_runtime",
+        render_func=render.timespan,
+        label="Run time",
+    )
+
+    endpoints = section.get("endpoints", {}).values()
+    requests = sum(stats["requests"] for stats in endpoints)
+    size = sum(stats["bytes"] for stats in endpoints)
+    yield Result(state=State.OK, summary="Requests: %d" % requests)
+    yield Metric("ovirt_api_requests", requests)
+    yield Result(state=State.OK, summary="Received: %s" % render.bytes(size))
+    yield Metric("ovirt_api_bytes", size)
+
+    for name, elapsed in sorted(section.get("sections", {}).items()):
+        yield Result(state=State.OK, notice="%s: %s" % (name, render.timespan(elapsed)))
+
+
+def _check_endpoint(params, stats: Dict[str, Any]) -> CheckResult:
+    requests = stats["requests"]
+    yield Result(state=State.OK, summary="Requests: %d" % requests)
+    yield Metric("ovirt_api_requests", requests)
+    if stats.get("cached"):
+        yield Result(state=State.OK, summary="Cached responses: %d" % stats["cached"])
+    if not requests:
+        return
+
+    yield from check_levels(
+        value=stats["latency"] / requests,
+        levels_upper=params.get("latency"),
+        metric_name="ovirt_api_latency",
+        render_func=render.timespan,
+        label="Average latency",
+    )
+    yield from check_levels(
+        value=stats["decode_time"],
+        levels_upper=params.get("decode_time"),
+        metric_name="ovirt_api_decode_time",
+        render_func=render.timespan,
+        label="JSON decode time",
+    )
+    yield Result(state=State.OK, summary="Received: %s" % render.bytes(stats["bytes"]))
+    yield Metric("ovirt_api_bytes", stats["bytes"])
+    yield Result(state=State.OK, summary="Objects: %d" % stats["objects"])
+    yield Metric("ovirt_api_objects", stats["objects"])
+
+
+def check_ovirt_plugin_perf(item, params, section: Dict[str, Any]) -> CheckResult:
+    if item == TOTAL_ITEM:
+        yield from _check_total(params, section)
+        return
+
+    stats = section.get("endpoints", {}).get(item)
+    if stats is None:
+        yield Result(state=State.OK, summary="Not requested in this run")
+        return
+    yield from _check_endpoint(params, stats)
+
+
+register.check_plugin(
+    name="ovirt_plugin_perf",
+    service_name="Ovirt API %s",
+    discovery_function=discovery_ovirt_plugin_perf,
+    check_function=check_ovirt_plugin_perf,
+    check_ruleset_name="ovirt_plugin_perf",
+    check_default_parameters={},
+)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8; py-indent-offset: 4 -*-
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+
+#
+# Ovirt Plugin
+# (c) 2021 DECOIT GmbH
+#
+
+#
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  Ovirt Plugin is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# ails.  You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+from typing import Any, Dict
+from cmk.base.plugins.agent_based.agent_based_api.v1 import (
+    register,
+    render,
+    Result,
+    Service,
+    State,
+)
+
+from cmk.base.plugins.agent_based.utils import ovirt
+
+
+def ovirt_run_state_parse(string_table):
+    return ovirt.parse_document(string_table)
+
+
+register.agent_section(
+    name="ovirt_run_state",
+    parse_function=ovirt_run_state_parse,
+)
+
+
+def discovery_ovirt_run_state(section):
+    yield Service()
+
+
+def _render_report(report: Dict[str, Any]) -> str:
+    text = "%s after %s" % (report["section"], render.timespan(report["elapsed"]))
+    if report.get("cached"):
+        text += " (using data cached %s)" % render.datetime(report["cached"])
+    return text
+
+
+def check_ovirt_run_state(section: Dict[str, Any]):
+    deadline = section.get("deadline", 0)
+
+    summary = "Run time: %s" % render.timespan(section.get("elapsed", 0))
+    if deadline:
+        summary += " (deadline %s)" % render.timespan(deadline)
+    yield Result(state=State.OK, summary=summary)
+
+    for key, title in (("cut_off", "Cut off"), ("failed", "Failed")):
+        reports = section.get(key, [])
+        if not reports:
+            continue
+        yield Result(
+            state=State.WARN,
+            summary="%s: %s" % (title, ", ".join(_render_report(report) for report in reports)),
+        )
+        for report in reports:
+            yield Result(state=State.OK, notice="%s: %s" % (report["section"], report["error"]))
+
+
+register.check_plugin(
+    name="ovirt_run_state",
+    service_name="Ovirt Plugin",
+    discovery_function=discovery_ovirt_run_state,
+    check_function=check_ovirt_run_state,
+)
@@ -19,7 +19,6 @@
 # to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
 # Boston, MA 02110-1301 USA.
 
-import json
 from typing import Dict, List
 from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     Metric,
@@ -31,11 +30,11 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     regex,
 )
 
+from cmk.base.plugins.agent_based.utils import ovirt
+
 
 def ovirt_snapshots_parse(string_table):
-    if string_table[0][0] != '@ovirt_version_info':
-        raise ValueError("Version Header required")
-    return json.loads(string_table[1][0]).get("snapshots", [])
+    return ovirt.parse_snapshots(ovirt.parse_document(string_table))
 
 
 register.agent_section(
@@ -48,7 +47,7 @@ def discovery_ovirt_snapshots(section):
     yield Service()
 
 
-def check_ovirt_snapshots(params, section):
+def check_ovirt_snapshots(params, section: List[ovirt.Snapshot]):
     if not section:
         yield Result(state=State.OK, summary="No Snapshots found.")
         return
@@ -73,14 +72,14 @@ def check_ovirt_snapshots(params, section):
     result = ''
     found = False
     for snapshot in section:
-        if "description" in snapshot \
-            and any( skip.match(snapshot["description"]) for skip in ignore) \
-            and not any( take.match(snapshot["description"]) for take in allow ):
+        if snapshot.description is not None \
+            and any( skip.match(snapshot.description) for skip in ignore) \
+            and not any( take.match(snapshot.description) for take in allow ):
             continue
-        if "snapshot_type" in snapshot and snapshot["snapshot_type"] == "active":
+        if snapshot.snapshot_type == "active":
             continue
         found = True
-        result += ", " + snapshot["description"]
+        result += ", " + snapshot.description
 
     if found:
         yield Result(state=State(params.get("state", 1)), summary=f"Found Snapshots: {result[2:]}")
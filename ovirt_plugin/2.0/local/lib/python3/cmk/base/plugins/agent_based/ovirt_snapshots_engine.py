@@ -19,9 +19,11 @@
 # to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
 # Boston, MA 02110-1301 USA.
 
-import json
-from typing import Dict, List
+import functools
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
 from cmk.base.plugins.agent_based.agent_based_api.v1 import (
+    check_levels,
     Metric,
     register,
     Result,
@@ -29,19 +31,14 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     State,
     HostLabel,
     regex,
+    render,
 )
 
+from cmk.base.plugins.agent_based.utils import ovirt
 
 
 def ovirt_snapshots_engine_parse(string_table):
-    if string_table[0][0] != '@ovirt_version_info':
-        raise ValueError("Version Header required")
-    section = {}
-    for line in string_table[1:]:
-        vm_json = json.loads(line[0])
-        section[vm_json["name"]] = vm_json["snapshots"]
-
-    return section
+    return {vm["name"]: ovirt.parse_snapshots(vm) for vm in ovirt.iter_documents(string_table)}
 
 
 register.agent_section(
@@ -53,41 +50,85 @@ def discovery_ovirt_snapshots_engine(section):
     yield Service()
 
 
-def check_ovirt_snapshots_engine(params, section: Dict[str,List[Dict]]):
+# VMs named in the summary, the full list is in the details
+_SUMMARY_MAX_VMS = 3
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(patterns: Tuple[str, ...]) -> Tuple[Pattern, ...]:
+    # Compiled one by one, joined into one expression inline flags like
+    # (?i) would no longer be at the start of the pattern
+    return tuple(regex(pattern) for pattern in patterns)
+
+
+def _matches(patterns: Tuple[Pattern, ...], text: str) -> bool:
+    return any(pattern.match(text) for pattern in patterns)
+
+
+def _snapshot_age(snapshot: ovirt.Snapshot, now: float) -> Optional[float]:
+    # the engine reports the creation date in milliseconds since the epoch
+    if snapshot.date is None:
+        return None
+    return max(now - float(snapshot.date) / 1000.0, 0.0)
+
+
+def check_ovirt_snapshots_engine(params, section: Dict[str, List[ovirt.Snapshot]]):
     if not section:
         yield Result(state=State.OK, summary="No Snapshots found.")
         return
 
-    ignore = []
-    try:
-        ignore.extend([ regex(item) for item in params["ignore"]])
-    except KeyError:
-        pass
-    
-    allow = []
-    try:
-        allow.extend([ regex(item) for item in params["allow"]])
-    except KeyError:
-        pass
-
-    result = ''
-    found = False
+    ignore = _compile(tuple(params.get("ignore", ())))
+    allow = _compile(tuple(params.get("allow", ())))
 
+    found: Dict[str, List[ovirt.Snapshot]] = {}
     for vm_name, snapshots in section.items():
         for snapshot in snapshots:
-            if "description" in snapshot \
-                and any( skip.match(snapshot["description"]) for skip in ignore ) \
-                and not any( take.match(snapshot["description"]) for take in allow ):
+            if snapshot.snapshot_type == "active":
                 continue
-            if "snapshot_type" in snapshot and snapshot["snapshot_type"] == "active":
+            if snapshot.description is not None \
+                and _matches(ignore, snapshot.description) \
+                and not _matches(allow, snapshot.description):
                 continue
-            found = True
-            result += f", {snapshot['description']} (on vm {vm_name})"
+            found.setdefault(vm_name, []).append(snapshot)
 
-    if found:
-        yield Result(state=State(params.get("state", 1)), summary=f"Found Snapshots: {result[2:]}")
-    else:
+    if not found:
         yield Result(state=State.OK, summary="No Snapshots found")
+        return
+
+    now = time.time()
+    oldest: Dict[str, float] = {}
+    for vm_name, snapshots in found.items():
+        ages = [age for age in (_snapshot_age(snapshot, now) for snapshot in snapshots) if age is not None]
+        if ages:
+            oldest[vm_name] = max(ages)
+
+    by_count = sorted(found, key=lambda vm_name: (-len(found[vm_name]), vm_name))
+    vm_list = ", ".join(f"{vm_name} ({len(found[vm_name])})" for vm_name in by_count[:_SUMMARY_MAX_VMS])
+    if len(by_count) > _SUMMARY_MAX_VMS:
+        vm_list += ", ..."
+    # With levels on the age only old snapshots and those without a date
+    # are a problem
+    age_levels = params.get("age")
+    undated = any(snapshot.date is None for snapshots in found.values() for snapshot in snapshots)
+    yield Result(
+        state=State(params.get("state", 1)) if age_levels is None or undated else State.OK,
+        summary="Found %d snapshots on %d VMs: %s" % (sum(len(snapshots) for snapshots in found.values()), len(found), vm_list),
+    )
+
+    if oldest:
+        oldest_vm = max(oldest, key=lambda vm_name: oldest[vm_name])
+        yield from check_levels(
+            value=oldest[oldest_vm],
+            levels_upper=age_levels,
+            render_func=render.timespan,
+            label=f"Oldest snapshot on vm {oldest_vm}",
+        )
+
+    for vm_name in sorted(found):
+        details = f"{vm_name}: " + ", ".join(str(snapshot.description) for snapshot in found[vm_name])
+        if vm_name in oldest:
+            details += " (oldest %s)" % render.timespan(oldest[vm_name])
+        yield Result(state=State.OK, notice=details)
 
 
 register.check_plugin(
@@ -19,7 +19,6 @@
 # to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
 # Boston, MA 02110-1301 USA.
 
-import json
 from typing import Dict, List
 
 from cmk.base.plugins.agent_based.agent_based_api.v1.type_defs import (
@@ -28,20 +27,25 @@ from cmk.base.plugins.agent_based.agent_based_api.v1.type_defs import (
 )
 
 from cmk.base.plugins.agent_based.agent_based_api.v1 import (
+    check_levels,
     get_value_store,
     register,
+    render,
     Result,
     Service,
     State,
 )
 
-from cmk.base.plugins.agent_based.utils import df
+from cmk.base.plugins.agent_based.utils import df, ovirt
 
 
-def ovirt_storage_domains_parse(string_table):
-    if string_table[0][0] != '@ovirt_version_info':
-        raise ValueError('Version Header required')
-    return json.loads(string_table[1][0])['storage_domains']
+def ovirt_storage_domains_parse(string_table) -> Dict[str, ovirt.StorageDomain]:
+    section: Dict[str, ovirt.StorageDomain] = {}
+    for domain_json in ovirt.parse_document(string_table)['storage_domains']:
+        domain = ovirt.StorageDomain.from_json(domain_json)
+        # a shared domain is listed for every data center it is attached to
+        section.setdefault(domain.item, domain)
+    return section
 
 
 register.agent_section(
@@ -50,43 +54,65 @@ register.agent_section(
 )
 
 
-def discovery_ovirt_storage_domains(section) -> DiscoveryResult:
-    for domain in section:
-        if domain.get("status", "") == "inactive":
+def discovery_ovirt_storage_domains(section: Dict[str, ovirt.StorageDomain]) -> DiscoveryResult:
+    for item, domain in section.items():
+        if domain.status == "inactive":
             continue
-        yield Service(item = f"{domain['name']} id {domain['id']}")
-
-
-def check_ovirt_storage_domains(item, params, section) -> CheckResult:
-    value_store = get_value_store()
-
-    for domain in section:
-        if f"{domain['name']} id {domain['id']}" != item:
-            continue
-
-        if domain["status"] == "inactive":
-            yield Result(state=State.UNKOWN, summary="Storage Domain inactive")
-            return
-
-        mib = 1024.0**2
-        committed_bytes = float(domain.get("committed", 0))
-        available_bytes = float(domain.get("available", 0))
-        size_bytes = available_bytes + float(domain.get("used", 0))
-
-        if size_bytes is None or size_bytes == 0 or available_bytes is None:
-            yield Result(state=State.UNKOWN, summary="Size of Storage Domain not available")
-            return
-
-        yield from df.df_check_filesystem_single(
-            value_store,
-            item,
-            size_bytes / mib,
-            available_bytes / mib,
-            0,
-            None,
-            None,
-            params=params
-        )
+        yield Service(item=item)
+
+
+def check_ovirt_storage_domains(item, params, section: Dict[str, ovirt.StorageDomain]) -> CheckResult:
+    domain = section.get(item)
+    if domain is None:
+        return
+
+    if domain.status == "inactive":
+        yield Result(state=State.UNKNOWN, summary="Storage Domain inactive")
+        return
+
+    mib = 1024.0**2
+    available_bytes = domain.available
+    size_bytes = available_bytes + domain.used
+
+    if size_bytes == 0:
+        yield Result(state=State.UNKNOWN, summary="Size of Storage Domain not available")
+        return
+
+    # The growth trend and the time left until the domain is full are
+    # computed by df over the value store, see trend_* in the parameters.
+    yield from df.df_check_filesystem_single(
+        get_value_store(),
+        item,
+        size_bytes / mib,
+        available_bytes / mib,
+        0,
+        None,
+        None,
+        params=params
+    )
+
+    yield from check_levels(
+        value=100.0 * domain.committed / size_bytes,
+        levels_upper=params.get("overprovisioning_levels"),
+        metric_name="overprovisioning",
+        render_func=render.percent,
+        label="Overprovisioning",
+    )
+
+    # The engine warns about the domain below this percentage of free space
+    if domain.warning_low_space_indicator is not None:
+        free_percent = 100.0 * available_bytes / size_bytes
+        if free_percent < domain.warning_low_space_indicator:
+            yield Result(
+                state=State(params.get("low_space_indicator_state", 1)),
+                summary="Free space below the engine's low space indicator of %s" % render.percent(
+                    domain.warning_low_space_indicator),
+            )
+        else:
+            yield Result(
+                state=State.OK,
+                notice="Engine's low space indicator: %s free" % render.percent(domain.warning_low_space_indicator),
+            )
 
 
 register.check_plugin(
@@ -95,5 +121,11 @@ register.check_plugin(
     discovery_function=discovery_ovirt_storage_domains,
     check_function=check_ovirt_storage_domains,
     check_ruleset_name="ovirt_storage_domains",
-    check_default_parameters=df.FILESYSTEM_DEFAULT_LEVELS,
+    check_default_parameters={
+        **df.FILESYSTEM_DEFAULT_LEVELS,
+        "trend_range": 24,
+        "trend_perfdata": True,
+        "trend_showtimeleft": True,
+        "low_space_indicator_state": 1,
+    },
 )
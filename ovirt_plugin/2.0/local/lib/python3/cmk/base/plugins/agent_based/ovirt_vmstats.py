@@ -19,7 +19,6 @@
 # to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
 # Boston, MA 02110-1301 USA.
 
-import json
 from typing import Dict, List
 from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     Metric,
@@ -31,18 +30,12 @@ from cmk.base.plugins.agent_based.agent_based_api.v1 import (
     regex,
 )
 
-def ovirt_vmstats_parse(string_table):
-    if string_table[0][0] != '@ovirt_version_info':
-        raise ValueError("Version Header required")
-    vm = json.loads(string_table[1][0])
-    section = {}
+from cmk.base.plugins.agent_based.utils import ovirt
+
 
-    try:
-        for stat in vm["statistics"]:
-            section[stat["description"]] = stat
-    except KeyError:
-        pass
-    return section
+def ovirt_vmstats_parse(string_table):
+    vm = ovirt.parse_document(string_table)
+    return ovirt.parse_statistics(vm)
 
 
 register.agent_section(
@@ -58,8 +51,8 @@ def discovery_ovirt_vmstats(section):
 
 def check_ovirt_vmstats(item, section):
     data = section[item]
-    yield Result(state=State.OK, summary="%s %s" % (data["value"], data["unit"]))
-    yield Metric(data["name"], float(data["value"]))
+    yield Result(state=State.OK, summary="%s %s" % (data.value, data.unit))
+    yield Metric(data.name, float(data.value))
 
 
 register.check_plugin(
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8; py-indent-offset: 4 -*-
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+
+#
+# Ovirt Plugin
+# (c) 2021 DECOIT GmbH
+#
+
+#
+# This is free software;  you can redistribute it and/or modify it
+# under the  terms of the  GNU General Public License  as published by
+# the Free Software Foundation in version 2.  Ovirt Plugin is  distributed
+# in the hope that it will be useful, but WITHOUT ANY WARRANTY;  with-
+# out even the implied warranty of  MERCHANTABILITY  or  FITNESS FOR A
+# PARTICULAR PURPOSE. See the  GNU General Public License for more de-
+# ails.  You should have  received  a copy of the  GNU  General Public
+# License along with GNU Make; see the file  COPYING.  If  not,  write
+# to the Free Software Foundation, Inc., 51 Franklin St,  Fifth Floor,
+# Boston, MA 02110-1301 USA.
+
+"""Parsing of the sections written by the ovirt_plugin agent plugin
+
+Every section starts with the line "@ovirt_version_info\\0<json>", followed by
+one JSON document per line. The records that occur in large numbers (per VM
+piggyback data) are slotted objects.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from cmk.base.plugins.agent_based.agent_based_api.v1.type_defs import StringTable
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+VERSION_HEADER = "@ovirt_version_info"
+
+
+def iter_documents(string_table: StringTable) -> Iterator[Any]:
+    """Validate the version header, then decode the JSON lines of the section"""
+    if not string_table or string_table[0][0] != VERSION_HEADER:
+        raise ValueError("Version Header required")
+    for line in string_table[1:]:
+        yield loads(line[0])
+
+
+def parse_document(string_table: StringTable) -> Any:
+    """Decode a section consisting of a single JSON document"""
+    for document in iter_documents(string_table):
+        return document
+    raise ValueError("Section data missing")
+
+
+class Statistic:
+    __slots__ = ("name", "description", "value", "unit")
+
+    def __init__(
+        self,
+        name: Optional[str],
+        description: str,
+        value: Optional[str],
+        unit: str = "",
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.value = value
+        self.unit = unit
+
+    @classmethod
+    def from_json(cls, stat: Dict[str, Any]) -> "Statistic":
+        # the agent only writes the keys the engine reported, a statistic
+        # lacking a value only fails its own item in the check
+        return cls(stat.get("name"), stat["description"], stat.get("value"), stat.get("unit", ""))
+
+
+def parse_statistics(vm: Dict[str, Any]) -> Dict[str, Statistic]:
+    """The statistics of a VM by description, those without one are skipped"""
+    return {
+        stat["description"]: Statistic.from_json(stat)
+        for stat in vm.get("statistics", [])
+        if "description" in stat
+    }
+
+
+class Snapshot:
+    __slots__ = ("id", "description", "snapshot_type", "snapshot_status", "date")
+
+    def __init__(
+        self,
+        id: Optional[str] = None,
+        description: Optional[str] = None,
+        snapshot_type: Optional[str] = None,
+        snapshot_status: Optional[str] = None,
+        date: Optional[int] = None,
+    ) -> None:
+        self.id = id
+        self.description = description
+        self.snapshot_type = snapshot_type
+        self.snapshot_status = snapshot_status
+        self.date = date
+
+    @classmethod
+    def from_json(cls, snapshot: Dict[str, Any]) -> "Snapshot":
+        return cls(
+            snapshot.get("id"),
+            snapshot.get("description"),
+            snapshot.get("snapshot_type"),
+            snapshot.get("snapshot_status"),
+            snapshot.get("date"),
+        )
+
+
+def parse_snapshots(vm: Dict[str, Any]) -> List[Snapshot]:
+    return [Snapshot.from_json(snapshot) for snapshot in vm.get("snapshots", [])]
+
+
+class StorageDomain:
+    __slots__ = ("name", "id", "status", "available", "used", "committed", "warning_low_space_indicator")
+
+    def __init__(
+        self,
+        name: str,
+        id: str,
+        status: str = "",
+        available: float = 0.0,
+        used: float = 0.0,
+        committed: float = 0.0,
+        warning_low_space_indicator: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.id = id
+        self.status = status
+        self.available = available
+        self.used = used
+        self.committed = committed
+        self.warning_low_space_indicator = warning_low_space_indicator
+
+    @property
+    def item(self) -> str:
+        return f"{self.name} id {self.id}"
+
+    @classmethod
+    def from_json(cls, domain: Dict[str, Any]) -> "StorageDomain":
+        indicator = domain.get("warning_low_space_indicator")
+        return cls(
+            domain["name"],
+            domain["id"],
+            domain.get("status", ""),
+            float(domain.get("available", 0)),
+            float(domain.get("used", 0)),
+            float(domain.get("committed", 0)),
+            None if indicator is None else float(indicator),
+        )
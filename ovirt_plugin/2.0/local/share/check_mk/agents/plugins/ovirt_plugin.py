@@ -31,21 +31,33 @@ plugin ("pip install requests").
 
 This plugin it will be called by the agent without any arguments.
 """
+import cProfile
 import logging
 import json
+import codecs
+import hashlib
 import os
+import tempfile
+import re
+import shutil
 import socket
 import sys
 import argparse
 import functools
 import time
 import multiprocessing
+import threading
 import configparser
+import contextlib
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode, quote
 from pprint import pprint
 
 try:
     import requests
-    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning, ReadTimeoutError
 except ImportError:
     sys.stdout.write("<<<ovirt_plugin_info>>>\n"
                      "Error: ovirt_plugin requires the requests library."
@@ -58,13 +70,39 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 MK_CONFDIR = os.getenv("MK_CONFDIR") or "/etc/check_mk"
 DEFAULT_CFG_FILE = os.path.join(MK_CONFDIR, "ovirt_plugin.cfg")
 
+MK_VARDIR = os.getenv("MK_VARDIR") or "/var/lib/check_mk_agent"
+DEFAULT_PROFILE_DIR = os.path.join(MK_VARDIR, "ovirt_plugin", "profile")
+DEFAULT_CACHE_DIR = os.path.join(MK_VARDIR, "ovirt_plugin", "cache")
+DEFAULT_SECTION_CACHE_DIR = os.path.join(MK_VARDIR, "ovirt_plugin", "sections")
+
 DEFAULT_CFG_SECTION = {
     "username": "admin@internal",
     "password": "",
     "engine_fqdn": "",
     "engine_url": "",
     "certfile": "",
-    "generate_piggyback": "true"
+    "generate_piggyback": "true",
+    "max_workers": "4",
+    "sso": "false",
+    "persistent_auth": "false",
+    "stream_vms": "false",
+    "page_size": "0",
+    "cache_ttl_clusters": "3600",
+    "cache_ttl_datacenters": "0",
+    "connect_timeout": "10",
+    "read_timeout": "60",
+    "deadline": "0",
+    "section_cache_max_age": "3600",
+}
+
+# Endpoints whose responses are cached on disk, with the config option
+# holding the number of seconds a cached response is used without asking
+# the engine. After that it is revalidated with ETag/Last-Modified where the
+# engine supports it. The data centers include the storage domain usage, so
+# they are only revalidated by default.
+CACHED_ENDPOINTS = {
+    "/api/clusters": "cache_ttl_clusters",
+    "/api/datacenters?follow=storage_domains": "cache_ttl_datacenters",
 }
 
 LOGGER = logging.getLogger(__name__)
@@ -93,6 +131,20 @@ def parse_arguments(argv=None):
                         "--config-file",
                         default=DEFAULT_CFG_FILE,
                         help='''Read config file (default: $MK_CONFDIR/ovirt_plugin.cfg)''')
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help='''Write cProfile statistics of the run to
+                        $MK_VARDIR/ovirt_plugin/profile/ (the requests are
+                        sent sequentially, as cProfile only profiles the
+                        calling thread)''')
+    parser.add_argument("--trace-memory",
+                        nargs="?",
+                        type=int,
+                        const=25,
+                        default=0,
+                        metavar="N",
+                        help='''Write the top N (default: 25) memory allocation
+                        sites of the run to $MK_VARDIR/ovirt_plugin/profile/''')
 
     args = parser.parse_args(argv)
 
@@ -125,13 +177,15 @@ def get_config(cfg_file):
 class Section(list):
     '''a very basic agent section class'''
     _OUTPUT_LOCK = multiprocessing.Lock()
+    # file the sections of the current thread are spooled to, see run_section
+    _SINK = threading.local()
 
     version_info = {
         'PluginVersion': VERSION
     }
 
-    # Should we need to parallelize one day, change this to be
-    # more like the Section class in agent_azure, for instance
+    # Sections are collected concurrently (see run_sections), so every
+    # section is written as one block while holding the output lock.
     def __init__(self, name=None, separator=0, piggytarget=None):
         super(Section, self).__init__()
         self.sep = chr(separator)
@@ -145,37 +199,444 @@ class Section(list):
     def write(self):
         if self[0].startswith('<<<<'):
             self.append('<<<<>>>>')
+        sink = getattr(self._SINK, "file", None)
+        if sink is not None:
+            for line in self:
+                sink.write("%s\n" % line)
+            return
         with self._OUTPUT_LOCK:
             for line in self:
                 sys.stdout.write("%s\n" % line)
             sys.stdout.flush()
 
+    @classmethod
+    def write_spooled(cls, spool, cached=None):
+        '''Write spooled sections, with cached=(mtime, interval) marked as cached data'''
+        spool.seek(0)
+        with cls._OUTPUT_LOCK:
+            if cached is None:
+                shutil.copyfileobj(spool, sys.stdout)
+            else:
+                for line in spool:
+                    if line.startswith('<<<') and not line.startswith('<<<<'):
+                        line = line.replace('>>>', ':cached(%d,%d)>>>' % cached, 1)
+                    sys.stdout.write(line)
+            sys.stdout.flush()
+
+
+class ResponseCache:
+    '''Engine responses stored as JSON files below MK_VARDIR'''
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def _path(self, url):
+        return os.path.join(self._directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def load(self, url):
+        try:
+            with open(self._path(url)) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def store(self, url, data, etag=None, last_modified=None):
+        entry = {
+            "url": url,
+            "timestamp": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "data": data,
+        }
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=self._directory, delete=False) as tmp:
+                json.dump(entry, tmp)
+            os.replace(tmp.name, self._path(url))
+        except OSError as exc:
+            LOGGER.info("could not cache response of %s: %s", url, exc)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    '''Point in time at which the run has to stop sending requests (0: never)'''
+
+    def __init__(self, seconds=0):
+        self.seconds = seconds
+        self._end = time.monotonic() + seconds if seconds > 0 else None
+
+    def remaining(self):
+        return None if self._end is None else self._end - time.monotonic()
+
+    def check(self, url):
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("deadline of %ss exceeded at %s" % (self.seconds, url))
+
+
+# Sections failing with these are reported as cut off, see run_section
+CUT_OFF_EXCEPTIONS = (DeadlineExceeded, requests.Timeout)
+
+
+class PerfStats:
+    '''Request and section timings of the run, written as the plugin_perf section
+
+    Requests are summed up per endpoint, i.e. the path without the query,
+    so the pages of a collection count as one endpoint. Responses taken
+    from the response cache without a request are counted as cached.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.sections = {}
+
+    def _endpoint(self, url):
+        return self.endpoints.setdefault(urlsplit(url).path, {
+            "requests": 0, "cached": 0, "latency": 0.0, "bytes": 0, "objects": 0, "decode_time": 0.0})
+
+    def add_request(self, url, latency, size, objects, decode_time):
+        with self._lock:
+            stats = self._endpoint(url)
+            stats["requests"] += 1
+            stats["latency"] += latency
+            stats["bytes"] += size
+            stats["objects"] += objects
+            stats["decode_time"] += decode_time
+
+    def add_cached(self, url):
+        with self._lock:
+            self._endpoint(url)["cached"] += 1
+
+    def add_section(self, name, elapsed):
+        with self._lock:
+            self.sections[name] = elapsed
+
+    def to_json(self, elapsed):
+        with self._lock:
+            return {
+                "elapsed": round(elapsed, 3),
+                "endpoints": {
+                    endpoint: {key: round(value, 4) for key, value in stats.items()}
+                    for endpoint, stats in self.endpoints.items()
+                },
+                "sections": {name: round(value, 3) for name, value in self.sections.items()},
+            }
+
+
+PERF = PerfStats()
+
+
+def _count_objects(data):
+    '''Number of elements of the collections in a response, 1 for a single object'''
+    if not isinstance(data, dict):
+        return 0
+    collections = [value for value in data.values() if isinstance(value, list)]
+    return sum(len(value) for value in collections) if collections else 1
+
 
 class MKOvirtClient:
 
     HEADERS = {'Accept': 'application/json', 'Version': '4'}
 
-    def __init__(self, config: dict):
+    SSO_TOKEN_PATH = "/ovirt-engine/sso/oauth/token"
+    SSO_LOGOUT_PATH = "/ovirt-engine/services/sso-logout"
+
+    def __init__(self, config: dict, deadline: Deadline = None):
         self._engine_url = config["engine_url"]
         self._auth = (config["username"], config["password"])
         self._engine_fqdn = config["engine_fqdn"]
         self._certfile = config["certfile"]
+        self._page_size = str2int(config.get("page_size"), 0)
+        self._cache = ResponseCache(DEFAULT_CACHE_DIR)
+        self._cache_ttl = {url: str2int(config.get(option), 0) for url, option in CACHED_ENDPOINTS.items()}
+        self._timeout = (str2int(config.get("connect_timeout"), 10), str2int(config.get("read_timeout"), 60))
+        self._deadline = deadline or Deadline()
+
+        # One pooled session for all sections, sized for the concurrent
+        # section workers, so TCP and TLS connections are kept alive.
+        pool_size = max(1, str2int(config.get("max_workers"), 1))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.verify = self._certfile if self._certfile else False
+        self._session.headers.update(self.HEADERS)
+
+        self._sso_token = None
+        if str2bool(config.get("sso")):
+            self._sso_token = self._get_sso_token()
+            self._session.headers["Authorization"] = "Bearer %s" % self._sso_token
+        else:
+            self._session.auth = self._auth
+            if str2bool(config.get("persistent_auth")):
+                # Let the engine keep an authenticated session (JSESSIONID
+                # cookie) instead of checking the credentials again on every
+                # request. The session stays open until it times out on the
+                # engine.
+                self._session.headers["Prefer"] = "persistent-auth"
+
+    def _timeout_for(self, url):
+        '''Connect and read timeout of a request, shortened to the time left until the deadline'''
+        self._deadline.check(url)
+        remaining = self._deadline.remaining()
+        if remaining is None:
+            return self._timeout
+        return (min(self._timeout[0], remaining), min(self._timeout[1], remaining))
+
+    def _sso_url(self, path):
+        url = urlsplit(self._engine_url)
+        return "%s://%s%s" % (url.scheme, url.netloc, path)
+
+    def _get_sso_token(self):
+        start = time.monotonic()
+        r = self._session.post(
+            self._sso_url(self.SSO_TOKEN_PATH),
+            data={
+                "grant_type": "password",
+                "scope": "ovirt-app-api",
+                "username": self._auth[0],
+                "password": self._auth[1],
+            },
+            headers={'Accept': 'application/json'},
+            timeout=self._timeout_for(self.SSO_TOKEN_PATH),
+        )
+        PERF.add_request(self.SSO_TOKEN_PATH, time.monotonic() - start, len(r.content), 0, 0.0)
+        token = r.json()
+        if "access_token" not in token:
+            raise RuntimeError("SSO login failed: %s" % token.get("error_description", token.get("error", r.status_code)))
+        LOGGER.debug("received SSO token from %s", self._sso_url(self.SSO_TOKEN_PATH))
+        return token["access_token"]
 
     def get_data(self, url):
-        r = requests.get(self._engine_url+url,
-                         auth=self._auth, verify=self._certfile if self._certfile else False, headers=self.HEADERS)
-        return r.json()
+        if url in self._cache_ttl:
+            return self._get_cached_data(url, self._cache_ttl[url])
+        r, body, latency = self._get(url)
+        return self._decode(url, body, latency)
+
+    def _get(self, url, **kwargs):
+        '''Request `url`, return the response, its body and the latency
+
+        The read timeout only applies to a single read, so the body is
+        downloaded in chunks and the deadline is checked between them, see
+        _iter_content. A failed request, e.g. a timeout, is recorded in PERF
+        right away.
+        '''
+        start = time.monotonic()
+        try:
+            with self._session.get(self._engine_url + url, stream=True, timeout=self._timeout_for(url), **kwargs) as r:
+                body = b"".join(self._iter_content(r, url))
+        except (DeadlineExceeded, requests.RequestException):
+            PERF.add_request(url, time.monotonic() - start, 0, 0, 0.0)
+            raise
+        return r, body, time.monotonic() - start
+
+    def _decode(self, url, body, latency):
+        '''Decode a response body and record it in PERF'''
+        start = time.monotonic()
+        data = None
+        try:
+            data = json.loads(body)
+            return data
+        finally:
+            PERF.add_request(url, latency, len(body), _count_objects(data), time.monotonic() - start)
+
+    def _get_cached_data(self, url, ttl):
+        # keyed by the absolute URL, instances for other engines share the cache directory
+        cache_url = self._engine_url + url
+        entry = self._cache.load(cache_url)
+        headers = {}
+        if entry is not None:
+            if time.time() - entry["timestamp"] < ttl:
+                LOGGER.debug("using cached response of %s", url)
+                PERF.add_cached(url)
+                return entry["data"]
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        r, body, latency = self._get(url, headers=headers)
+        if r.status_code == 304 and entry is not None:
+            LOGGER.debug("cached response of %s is still valid", url)
+            PERF.add_request(url, latency, 0, 0, 0.0)
+            self._cache.store(cache_url, entry["data"], entry.get("etag"), entry.get("last_modified"))
+            return entry["data"]
+
+        data = self._decode(url, body, latency)
+        if r.status_code == 200:
+            self._cache.store(cache_url, data, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return data
+
+    def iter_data(self, url, key):
+        '''Yield the elements of the collection `key` while the response is downloaded
+
+        The latency is the time until the response headers arrived. Waiting
+        for the body is accounted to it as well, the decode time is the rest
+        of the time spent in this generator.
+        '''
+        start = time.monotonic()
+        latency = None
+        transfer = {"bytes": 0, "time": 0.0}
+        objects = 0
+        busy = 0.0
+        try:
+            with self._session.get(self._engine_url + url, stream=True, timeout=self._timeout_for(url)) as r:
+                latency = time.monotonic() - start
+                decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")()
+                chunks = (decoder.decode(chunk) for chunk in self._iter_content(r, url, transfer))
+                elements = iter_json_array(chunks, key)
+                while True:
+                    before = time.monotonic()
+                    # the elements are JSON objects, None marks the end
+                    element = next(elements, None)
+                    busy += time.monotonic() - before
+                    if element is None:
+                        break
+                    objects += 1
+                    yield element
+        finally:
+            if latency is None:
+                latency = time.monotonic() - start
+            PERF.add_request(url, latency + transfer["time"], transfer["bytes"], objects,
+                             max(busy - transfer["time"], 0.0))
+
+    def _iter_content(self, response, url, transfer=None):
+        '''The chunks of a streamed response, stopped at the deadline
+
+        The number of bytes and the time spent waiting for them are summed up
+        in `transfer`, if given.
+        '''
+        if transfer is None:
+            transfer = {"bytes": 0, "time": 0.0}
+        try:
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            while True:
+                before = time.monotonic()
+                chunk = next(chunks, None)
+                transfer["time"] += time.monotonic() - before
+                if chunk is None:
+                    break
+                transfer["bytes"] += len(chunk)
+                self._deadline.check(url)
+                yield chunk
+        except requests.ConnectionError as exc:
+            # requests reports a read timeout of a streamed response as ConnectionError
+            if exc.args and isinstance(exc.args[0], ReadTimeoutError):
+                raise requests.ReadTimeout(exc) from exc
+            raise
+
+    def iter_collection(self, path, key, stream=False, **parameters):
+        '''Yield the elements of the collection `key` at `path`
+
+        If a page size is configured the collection is requested in pages of
+        that size (oVirt search "page N" together with "max"), otherwise in
+        one request. Further query parameters like follow or all_content are
+        passed in `parameters`.
+        '''
+        if self._page_size <= 0:
+            url = path + ("?" + urlencode(parameters, safe=",", quote_via=quote) if parameters else "")
+            if stream:
+                yield from self.iter_data(url, key)
+            else:
+                yield from (self.get_data(url) or {}).get(key, [])
+            return
+
+        page = 1
+        while True:
+            query = dict(parameters, search="sortby name asc page %d" % page, max=self._page_size)
+            url = path + "?" + urlencode(query, safe=",", quote_via=quote)
+            if stream:
+                elements = self.iter_data(url, key)
+            else:
+                elements = (self.get_data(url) or {}).get(key, [])
+            count = 0
+            for element in elements:
+                count += 1
+                yield element
+            LOGGER.debug("read %d elements from page %d of %s", count, page, path)
+            if count < self._page_size:
+                return
+            page += 1
+
+    def close(self):
+        try:
+            if self._sso_token is not None:
+                # bounded by the deadline as well, the token expires on its own
+                self._session.post(
+                    self._sso_url(self.SSO_LOGOUT_PATH),
+                    data={"scope": "", "token": self._sso_token},
+                    timeout=self._timeout_for(self.SSO_LOGOUT_PATH),
+                )
+        except (DeadlineExceeded, requests.RequestException) as exc:
+            LOGGER.info("SSO logout failed: %s", exc)
+        finally:
+            self._session.close()
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(chunks, key):
+    '''Incrementally decode the array `key` of a JSON object from text chunks
+
+    Only the current array element is kept in memory. The elements have to
+    be JSON objects or arrays, i.e. a truncated element can not be decoded.
+    A response without `key` (the engine omits empty collections) yields
+    nothing.
+    '''
+    decoder = json.JSONDecoder()
+    array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+
+    buf = ''
+    for chunk in chunks:
+        buf += chunk
+        match = array_start.search(buf)
+        if match:
+            break
+    else:
+        return
+
+    pos = match.end()
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos == len(buf):
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError("Unexpected end of JSON array %r" % key)
+            buf, pos = chunk, 0
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield element
+        buf, pos = buf[end:], 0
 
 
 def time_it(func):
-    '''Decorator to time the function'''
+    '''Decorator to time the function, the run time is recorded in PERF'''
     @functools.wraps(func)
     def wrapped(*args, **kwargs):
-        before = time.time()
+        before = time.monotonic()
         try:
             return func(*args, **kwargs)
         finally:
-            LOGGER.info("%r took %ss", func.func_name, time.time() - before)
+            elapsed = time.monotonic() - before
+            LOGGER.info("%r took %.3fs", func.__name__, elapsed)
+            PERF.add_section(func.__name__, elapsed)
 
     return wrapped
 
@@ -189,16 +650,57 @@ def write_section_compatibility():
     section.write()
 
 
+# section functions collecting COMPATIBILITY_RESULT
+COMPATIBILITY_SOURCES = {"section_overview", "read_data_centers", "read_clusters"}
+
+
+@time_it
+def section_compatibility(client: MKOvirtClient, generate_piggyback: bool = True):
+    '''Write the compatibility section once the other sections are done'''
+    missing = FAILED_SECTIONS & COMPATIBILITY_SOURCES
+    if missing:
+        raise RuntimeError("data of %s missing" % ", ".join(sorted(missing)))
+    write_section_compatibility()
+
+
+HOST_KEYS = ["version", "status", "summary", "type", "name", "libvirt_version", "hosted_engine"]
+
 GLOBAL_HOSTS = []
+GLOBAL_HOSTS_LOCK = threading.Lock()
 
 
 def get_hosts(client: MKOvirtClient):
+    '''Hosts reduced to HOST_KEYS, shared by all host sections'''
     global GLOBAL_HOSTS
-    if not GLOBAL_HOSTS:
-        GLOBAL_HOSTS = client.get_data("/api/hosts?all_content=true")
+    with GLOBAL_HOSTS_LOCK:
+        if not GLOBAL_HOSTS:
+            # all_content is required for hosted_engine
+            GLOBAL_HOSTS = [
+                {key: host[key] for key in HOST_KEYS if key in host}
+                for host in client.iter_collection("/api/hosts", "host", all_content="true")
+                if host
+            ]
     return GLOBAL_HOSTS
 
 
+GLOBAL_VMS = []
+GLOBAL_VMS_LOCK = threading.Lock()
+
+
+def get_vms(client: MKOvirtClient):
+    '''Pairs of VM statistics and snapshots objects, shared by all VM sections'''
+    global GLOBAL_VMS
+    with GLOBAL_VMS_LOCK:
+        if not GLOBAL_VMS:
+            GLOBAL_VMS = [
+                (_vm_stats_obj(vm), _vm_snapshots_obj(vm))
+                for vm in client.iter_collection("/api/vms", "vm", follow="statistics,snapshots")
+                if vm
+            ]
+    return GLOBAL_VMS
+
+
+@time_it
 def section_overview(client: MKOvirtClient, generate_piggyback: bool = True):
     api = client.get_data("/api")
     result = {}
@@ -209,34 +711,27 @@ def section_overview(client: MKOvirtClient, generate_piggyback: bool = True):
         COMPATIBILITY_RESULT["engine"] = api["product_info"]
     # Global Maintainance only found in hosts
     result["global_maintenance"] = False
-    hosts = get_hosts(client)
-    if hosts and "host" in hosts:
-        for host in hosts["host"]:
-            if "hosted_engine" in host and host["hosted_engine"] and "global_maintenance" in host["hosted_engine"] and host["hosted_engine"]["global_maintenance"] == "true":
-                result["global_maintenance"] = True
-                break
+    for host in get_hosts(client):
+        if "hosted_engine" in host and host["hosted_engine"] and "global_maintenance" in host["hosted_engine"] and host["hosted_engine"]["global_maintenance"] == "true":
+            result["global_maintenance"] = True
+            break
 
     section = Section('overview')
     section.append(json.dumps(result))
     section.write()
 
 
+@time_it
 def section_hosts(client: MKOvirtClient, generate_piggyback: bool = True):
     if not generate_piggyback:
         return
-    hosts = get_hosts(client)
-    if not hosts or not "host" in hosts:
-        return
-    for host in hosts["host"]:
-        host_obj = {}
-        for key in ["version", "status", "summary", "type", "name", "libvirt_version", "hosted_engine"]:
-            if host and key in host:
-                host_obj[key] = host[key]
+    for host_obj in get_hosts(client):
         section = Section('hosts', piggytarget=host_obj["name"])
         section.append(json.dumps(host_obj))
         section.write()
 
 
+@time_it
 def read_data_centers(client: MKOvirtClient, generate_piggyback: bool = True):
     datacenters = client.get_data("/api/datacenters?follow=storage_domains")
     data_center_result = {}
@@ -272,6 +767,7 @@ def read_data_centers(client: MKOvirtClient, generate_piggyback: bool = True):
     section.write()
 
 
+@time_it
 def read_clusters(client: MKOvirtClient, generate_piggyback: bool = True):
     clusters = client.get_data("/api/clusters")
     cluster_result = {}
@@ -296,57 +792,245 @@ def read_clusters(client: MKOvirtClient, generate_piggyback: bool = True):
     section.write()
 
 
+def _vm_stats_obj(vm):
+    vm_obj = {}
+
+    for key in ["name", "type"]:
+        if vm and key in vm:
+            vm_obj[key] = vm[key]
+
+    if "statistics" in vm and "statistic" in vm["statistics"]:
+        for stat in vm["statistics"]["statistic"]:
+            if stat["name"] not in ["network.current.total", "cpu.current.total", "cpu.current.hypervisor", "cpu.current.guest", "memory.installed"]:
+                continue
+            stat_obj = {k: v for k, v in stat.items() if k in [
+                "name", "type", "unit", "description"]}
+            for _, value in stat["values"]["value"][0].items():
+                stat_obj["value"] = str(value)
+            vm_obj.setdefault("statistics", []).append(stat_obj)
+    return vm_obj
+
+
+def _vm_snapshots_obj(vm):
+    vm_obj = {}
+
+    for key in ["name", "type"]:
+        if vm and key in vm:
+            vm_obj[key] = vm[key]
+
+    if "snapshots" in vm and "snapshot" in vm["snapshots"]:
+        for snap in vm["snapshots"]["snapshot"]:
+            vm_obj.setdefault("snapshots", []).append({k: v for k, v in snap.items() if k in [
+                "snapshot_status", "snapshot_type", "description", "date", "id"]})
+    return vm_obj
+
+
+@time_it
 def section_vms_stats(client: MKOvirtClient, generate_piggyback: bool = True):
     if not generate_piggyback:
         return
 
-    vms = client.get_data("/api/vms?follow=statistics")
-    if not vms or not "vm" in vms:
-        return
-    for vm in vms['vm']:
-        vm_obj = {}
-
-        for key in ["name", "type"]:
-            if vm and key in vm:
-                vm_obj[key] = vm[key]
-
-        if "statistics" in vm and "statistic" in vm["statistics"]:
-            for stat in vm["statistics"]["statistic"]:
-                if stat["name"] not in ["network.current.total", "cpu.current.total", "cpu.current.hypervisor", "cpu.current.guest", "memory.installed"]:
-                    continue
-                stat_obj = {k: v for k, v in stat.items() if k in [
-                    "name", "type", "unit", "description"]}
-                for _, value in stat["values"]["value"][0].items():
-                    stat_obj["value"] = str(value)
-                vm_obj.setdefault("statistics", []).append(stat_obj)
+    for vm_obj, _ in get_vms(client):
         section = Section('vmstats', piggytarget=vm_obj["name"])
         section.append(json.dumps(vm_obj))
         section.write()
 
 
+@time_it
 def section_vms_snapshots(client: MKOvirtClient, generate_piggyback: bool = True):
-    vms = client.get_data("/api/vms?follow=snapshots")
-    if not vms or not "vm" in vms:
+    vms = get_vms(client)
+    if not vms:
         return
     section = Section('snapshots_engine')
-    for vm in vms['vm']:
-        vm_obj = {}
+    for _, vm_obj in vms:
+        section.append(json.dumps(vm_obj))
+        if generate_piggyback:
+            piggy_section = Section('snapshots', piggytarget=vm_obj["name"])
+            piggy_section.append(json.dumps(vm_obj))
+            piggy_section.write()
 
-        for key in ["name", "type"]:
-            if vm and key in vm:
-                vm_obj[key] = vm[key]
+    section.write()
 
-        if "snapshots" in vm and "snapshot" in vm["snapshots"]:
-            for snap in vm["snapshots"]["snapshot"]:
-                vm_obj.setdefault("snapshots", []).append({k: v for k, v in snap.items() if k in [
-                    "snapshot_status", "snapshot_type", "description", "date", "id"]})
 
-        section.append(json.dumps(vm_obj))
+@time_it
+def section_vms_streamed(client: MKOvirtClient, generate_piggyback: bool = True):
+    '''Write the VM sections while the VM collection is downloaded
+
+    Replaces section_vms_stats and section_vms_snapshots for large engines:
+    every VM is written as soon as it is decoded, only the small snapshot
+    lines of the engine section are kept until the end.
+    '''
+    section = Section('snapshots_engine')
+    for vm in client.iter_collection("/api/vms", "vm", stream=True, follow="statistics,snapshots"):
+        snapshots_obj = _vm_snapshots_obj(vm)
+        section.append(json.dumps(snapshots_obj))
         if generate_piggyback:
-            piggy_section = Section('snapshots', piggytarget=vm_obj["name"])
+            vm_obj = _vm_stats_obj(vm)
+            piggy_section = Section('vmstats', piggytarget=vm_obj["name"])
             piggy_section.append(json.dumps(vm_obj))
             piggy_section.write()
+            piggy_section = Section('snapshots', piggytarget=snapshots_obj["name"])
+            piggy_section.append(json.dumps(snapshots_obj))
+            piggy_section.write()
+
+    if len(section) > 2:
+        section.write()
+
+
+SECTION_FUNCTIONS = [
+    section_overview,
+    read_data_centers,
+    read_clusters,
+    section_hosts,
+]
+
+VM_SECTION_FUNCTIONS = [
+    section_vms_stats,
+    section_vms_snapshots,
+]
+
+VM_SECTION_FUNCTIONS_STREAMED = [
+    section_vms_streamed,
+]
+
+
+class SectionCache:
+    '''Output of the last successful run of every section function below MK_VARDIR
+
+    The output is kept per engine, as instances of the plugin for different
+    engines share MK_VARDIR, see set_engine.
+    '''
+
+    def __init__(self, directory, max_age):
+        self._base_directory = directory
+        self._directory = directory
+        self.max_age = max_age
 
+    def set_engine(self, engine_url):
+        self._directory = os.path.join(
+            self._base_directory, hashlib.sha1(engine_url.encode("utf-8")).hexdigest())
+
+    def path(self, name):
+        return os.path.join(self._directory, name + ".txt")
+
+    def open_spool(self):
+        '''Temporary file in the cache directory, moved into the cache by store'''
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            return tempfile.NamedTemporaryFile("w+", encoding="utf-8", dir=self._directory, delete=False)
+        except OSError as exc:
+            LOGGER.info("can not cache sections in %s: %s", self._directory, exc)
+            return tempfile.TemporaryFile("w+", encoding="utf-8")
+
+    def store(self, name, spool):
+        if not isinstance(spool.name, str):  # not in the cache directory
+            return
+        try:
+            spool.flush()
+            os.replace(spool.name, self.path(name))
+        except OSError as exc:
+            LOGGER.info("could not cache section %s: %s", name, exc)
+
+    def open_cached(self, name):
+        '''The cached output and its mtime, None if missing or older than max_age'''
+        try:
+            mtime = os.stat(self.path(name)).st_mtime
+            if time.time() - mtime > self.max_age:
+                return None, None
+            return open(self.path(name), encoding="utf-8"), mtime
+        except OSError:
+            return None, None
+
+
+SECTION_CACHE = SectionCache(DEFAULT_SECTION_CACHE_DIR, 3600)
+
+# names of the section functions that failed in this run
+FAILED_SECTIONS = set()
+
+
+def run_section(func, client: MKOvirtClient, generate_piggyback: bool = True):
+    '''Run a section function, return a report if it was cut off or failed
+
+    The output of the function is spooled. If it succeeds, the output is
+    written and kept as the last good copy. If it is cut off by a timeout or
+    the deadline or fails otherwise, the last good copy is written instead,
+    marked as cached. Without a copy the output written until the failure is
+    used, as before.
+    '''
+    name = func.__name__
+    start = time.monotonic()
+    spool = SECTION_CACHE.open_spool()
+    Section._SINK.file = spool
+    try:
+        func(client, generate_piggyback=generate_piggyback)
+    except CUT_OFF_EXCEPTIONS as exc:
+        report = {"section": name, "reason": "cut_off", "error": str(exc)}
+    except () if DEBUG else Exception as exc:
+        report = {"section": name, "reason": "failed", "error": "%s: %s" % (type(exc).__name__, exc)}
+    else:
+        report = None
+    finally:
+        Section._SINK.file = None
+
+    try:
+        if report is None:
+            Section.write_spooled(spool)
+            SECTION_CACHE.store(name, spool)
+            return None
+
+        report["elapsed"] = round(time.monotonic() - start, 3)
+        FAILED_SECTIONS.add(name)
+        LOGGER.info("%s %s after %.3fs: %s", name, report["reason"], report["elapsed"], report["error"])
+        cached, mtime = SECTION_CACHE.open_cached(name)
+        report["cached"] = mtime
+        if cached is None:
+            Section.write_spooled(spool)
+        else:
+            with cached:
+                Section.write_spooled(cached, (mtime, SECTION_CACHE.max_age))
+        return report
+    finally:
+        spool.close()
+        if isinstance(spool.name, str) and os.path.exists(spool.name):
+            os.remove(spool.name)
+
+
+def run_sections(client: MKOvirtClient, generate_piggyback: bool = True, max_workers: int = 1, stream_vms: bool = False):
+    '''Run all section functions, concurrently if more than one worker is configured
+
+    The section functions only share the hosts and VM caches and
+    COMPATIBILITY_RESULT, so their requests against the engine can be sent
+    in parallel. Sections cut off by a timeout or the deadline or failing
+    otherwise are returned as reports, see run_section.
+    '''
+    functions = SECTION_FUNCTIONS + (VM_SECTION_FUNCTIONS_STREAMED if stream_vms else VM_SECTION_FUNCTIONS)
+
+    if max_workers <= 1:
+        reports = [run_section(func, client, generate_piggyback) for func in functions]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_section, func, client, generate_piggyback)
+                       for func in functions]
+            reports = [future.result() for future in futures]
+    report = run_section(section_compatibility, client, generate_piggyback)
+    reports.append(report)
+    return [report for report in reports if report is not None]
+
+
+def write_section_run_state(deadline: Deadline, elapsed: float, reports: list):
+    section = Section('run_state')
+    section.append(json.dumps({
+        "deadline": deadline.seconds,
+        "elapsed": round(elapsed, 3),
+        "cut_off": [report for report in reports if report["reason"] == "cut_off"],
+        "failed": [report for report in reports if report["reason"] == "failed"],
+    }))
+    section.write()
+
+
+def write_section_plugin_perf(elapsed: float):
+    section = Section('plugin_perf')
+    section.append(json.dumps(PERF.to_json(elapsed)))
     section.write()
 
 # .
@@ -366,6 +1050,13 @@ def str2bool(v: str):
     return v is not None and v.lower() in ("yes", "true", "t", "1")
 
 
+def str2int(v: str, default: int = 0):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
 def report_exception_to_server(exc, location):
     LOGGER.info("handling exception: %s", exc)
     msg = "Plugin exception in %s: %s" % (location, exc)
@@ -374,34 +1065,90 @@ def report_exception_to_server(exc, location):
     sec.write()
 
 
+@contextlib.contextmanager
+def profiling(profile: bool = False, trace_memory: int = 0, directory: str = DEFAULT_PROFILE_DIR):
+    '''Profile the enclosed code and write the results to `directory`
+
+    The cProfile statistics are written in the format of the pstats module,
+    the top `trace_memory` allocation sites as text. Nothing is written to
+    stdout, so the agent output is not affected.
+    '''
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        prefix = os.path.join(directory, "%s-%d" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+        try:
+            if profiler is not None or snapshot is not None:
+                os.makedirs(directory, exist_ok=True)
+            if profiler is not None:
+                profiler.dump_stats(prefix + ".pstats")
+                LOGGER.info("wrote profile to %s.pstats", prefix)
+            if snapshot is not None:
+                snapshot = snapshot.filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ))
+                with open(prefix + ".memory.txt", "w") as memory_file:
+                    memory_file.write("peak: %d bytes\n" % peak)
+                    for stat in snapshot.statistics("lineno")[:trace_memory]:
+                        memory_file.write("%s\n" % stat)
+                LOGGER.info("wrote memory allocation sites to %s.memory.txt", prefix)
+        except OSError as exc:
+            LOGGER.info("could not write profile to %s: %s", directory, exc)
+
+
 def main():
 
     args = parse_arguments()
+    with profiling(args.profile, args.trace_memory):
+        run(args)
+
+
+def run(args):
     config: dict = get_config(args.config_file)
 
     if not config["engine_url"]:
         report_exception_to_server("Config could not be read", "main")
         sys.exit(1)
 
+    start = time.monotonic()
+    deadline = Deadline(str2int(config["deadline"], 0))
+    SECTION_CACHE.max_age = str2int(config["section_cache_max_age"], 3600)
+    SECTION_CACHE.set_engine(config["engine_url"])
+
     try:  # first calls by docker-daemon: report failure
-        client = MKOvirtClient(config)
+        client = MKOvirtClient(config, deadline)
     except () if DEBUG else Exception as exc:
         report_exception_to_server(exc, "main")
         sys.exit(1)
 
     _generate_piggyback = str2bool(config["generate_piggyback"])
+    # cProfile only sees the main thread, so profiled runs are sequential
+    _max_workers = 1 if args.profile else str2int(config["max_workers"], 1)
+    _stream_vms = str2bool(config["stream_vms"])
 
     try:
-        section_overview(client, generate_piggyback=_generate_piggyback)
-        read_data_centers(client, generate_piggyback=_generate_piggyback)
-        read_clusters(client, generate_piggyback=_generate_piggyback)
-        section_hosts(client, generate_piggyback=_generate_piggyback)
-        section_vms_stats(client, generate_piggyback=_generate_piggyback)
-        section_vms_snapshots(client, generate_piggyback=_generate_piggyback)
-        write_section_compatibility()
+        reports = run_sections(client, generate_piggyback=_generate_piggyback, max_workers=_max_workers, stream_vms=_stream_vms)
+        write_section_run_state(deadline, time.monotonic() - start, reports)
+        write_section_plugin_perf(time.monotonic() - start)
     except () if DEBUG else Exception as exc:
         report_exception_to_server(exc, "get data")
         sys.exit(1)
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
@@ -22,7 +22,9 @@
 
 from cmk.gui.i18n import _
 from cmk.gui.valuespec import (
+    Age,
     Dictionary,
+    Float,
     Percentage,
     TextAscii,
     Tuple,
@@ -59,6 +61,17 @@ def _parameter_ovirt_snapshots():
                  title = _('Reqular expressions for snapshots to ignore'),
                  )
             ),
+            ('age',
+             Tuple(
+                 title = _('Levels on the age of the oldest snapshot (engine service only)'),
+                 help = _('If set, snapshots younger than the warning level are OK and the state '
+                          'configured above is only used for snapshots without a date.'),
+                 elements = [
+                     Age(title = _('Warning at'), default_value = 7 * 86400),
+                     Age(title = _('Critical at'), default_value = 14 * 86400),
+                 ],
+                 )
+            ),
         ],
     )
 
@@ -74,6 +87,20 @@ rulespec_registry.register(
 def _parameter_ovirt_storage_domains():
     return Dictionary(
         elements=filesystem_elements + [
+            ("overprovisioning_levels",
+             Tuple(
+                 title=_("Levels on overprovisioning"),
+                 help=_("The space committed to the disks of the VMs in percent of the size of the storage domain."),
+                 elements=[
+                     Percentage(title=_("Warning at"), maxvalue=None, default_value=100.0),
+                     Percentage(title=_("Critical at"), maxvalue=None, default_value=150.0),
+                 ],
+             )),
+            ("low_space_indicator_state",
+             MonitoringState(
+                 title=_("State if the free space is below the low space indicator of the engine"),
+                 default_value=1,
+             )),
         ],
         hidden_keys=["flex_levels", 
                      "show_reserved", "subtract_reserved",
@@ -90,4 +117,46 @@ rulespec_registry.register(
         parameter_valuespec=_parameter_ovirt_storage_domains,
         title=lambda: _("oVirt storage domain capacity"),
     )
-)
\ No newline at end of file
+)
+
+def _parameter_ovirt_plugin_perf():
+    return Dictionary(
+        elements=[
+            ("runtime",
+             Tuple(
+                 title=_("Levels on the run time of the plugin (item Total)"),
+                 elements=[
+                     Age(title=_("Warning at"), default_value=60),
+                     Age(title=_("Critical at"), default_value=120),
+                 ],
+             )),
+            ("latency",
+             Tuple(
+                 title=_("Levels on the average latency of the requests to an endpoint"),
+                 elements=[
+                     Float(title=_("Warning at"), unit=_("seconds"), default_value=5.0),
+                     Float(title=_("Critical at"), unit=_("seconds"), default_value=10.0),
+                 ],
+             )),
+            ("decode_time",
+             Tuple(
+                 title=_("Levels on the time spent decoding the JSON responses of an endpoint"),
+                 elements=[
+                     Float(title=_("Warning at"), unit=_("seconds"), default_value=5.0),
+                     Float(title=_("Critical at"), unit=_("seconds"), default_value=10.0),
+                 ],
+             )),
+        ],
+    )
+
+
+rulespec_registry.register(
+    CheckParameterRulespecWithItem(
+        check_group_name="ovirt_plugin_perf",
+        group=RulespecGroupCheckParametersApplications,
+        item_spec=lambda: TextAscii(title=_("API endpoint or Total"), allow_empty=False),
+        match_type="dict",
+        parameter_valuespec=_parameter_ovirt_plugin_perf,
+        title=lambda: _("oVirt plugin performance"),
+    )
+)
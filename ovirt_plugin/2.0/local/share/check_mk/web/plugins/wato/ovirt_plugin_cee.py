@@ -38,6 +38,7 @@ from cmk.gui.valuespec import (
     Tuple,
     DropdownChoice,
     FixedValue,
+    Integer,
 )
 
 
@@ -88,6 +89,97 @@ def _valuespec_agent_config_ovirt_plugin():
                              (False, _("Do not Generate Piggyback Data")),
                          ]
                      )),
+                    ("max_workers",
+                     Integer(
+                         title=_("Number of parallel API requests"),
+                         help=_("Number of sections that are requested from the engine at the same time. "
+                                "Use 1 to query the engine sequentially."),
+                         minvalue=1,
+                         default_value=4,
+                     )),
+                    ("sso",
+                     DropdownChoice(
+                         title=_("Authentication"),
+                         help=_("With SSO the plugin requests an access token once per run instead of "
+                                "authenticating every API request against the engine."),
+                         choices=[
+                             (False, _("Basic authentication")),
+                             (True, _("SSO access token")),
+                         ]
+                     )),
+                    ("persistent_auth",
+                     DropdownChoice(
+                         title=_("Persistent session with basic authentication"),
+                         help=_("Ask the engine to keep an authenticated session for the requests of a run "
+                                "instead of checking the credentials on every request. The engine keeps "
+                                "every session until its session timeout, so with short check intervals "
+                                "idle sessions accumulate on the engine. Not used with SSO."),
+                         choices=[
+                             (False, _("Authenticate every request")),
+                             (True, _("Use a persistent session")),
+                         ]
+                     )),
+                    ("stream_vms",
+                     DropdownChoice(
+                         title=_("Processing of the VM list"),
+                         help=_("In streaming mode every VM is written as soon as it is received. "
+                                "This keeps the memory usage of the plugin low on engines with many VMs."),
+                         choices=[
+                             (False, _("Load the complete VM list")),
+                             (True, _("Stream the VM list")),
+                         ]
+                     )),
+                    ("page_size",
+                     Integer(
+                         title=_("Page size for hosts and VMs"),
+                         help=_("Request hosts and VMs in pages of this size. "
+                                "Use 0 to request the complete collection at once."),
+                         minvalue=0,
+                         default_value=0,
+                     )),
+                    ("cache_ttl_clusters",
+                     Age(
+                         title=_("Cache clusters for"),
+                         help=_("Reuse the cluster list for this time before it is requested from the engine again."),
+                         default_value=3600,
+                     )),
+                    ("cache_ttl_datacenters",
+                     Age(
+                         title=_("Cache data centers and storage domains for"),
+                         help=_("Reuse the data centers for this time before they are requested from the engine again. "
+                                "They contain the storage domain usage, so the default of 0 only revalidates "
+                                "the cached response with the engine."),
+                         default_value=0,
+                     )),
+                    ("connect_timeout",
+                     Age(
+                         title=_("Connect timeout"),
+                         help=_("Time to wait for a connection to the engine."),
+                         default_value=10,
+                     )),
+                    ("read_timeout",
+                     Age(
+                         title=_("Read timeout"),
+                         help=_("Time to wait for the engine to send data on an established connection."),
+                         default_value=60,
+                     )),
+                    ("deadline",
+                     Age(
+                         title=_("Deadline for the whole run"),
+                         help=_("Sections that are not complete after this time are cut off and reported "
+                                "in the service <i>Ovirt Plugin</i>, the sections completed until then are "
+                                "written. Set it below the agent timeout or the interval of the plugin. "
+                                "Use 0 for no deadline."),
+                         default_value=0,
+                     )),
+                    ("section_cache_max_age",
+                     Age(
+                         title=_("Use the last good data of a failing section for"),
+                         help=_("If a section can not be read from the engine, its output of the last "
+                                "successful run is sent instead, marked as cached, as long as it is not "
+                                "older than this."),
+                         default_value=3600,
+                     )),
                 ],
                 optional_keys=False,
             ),
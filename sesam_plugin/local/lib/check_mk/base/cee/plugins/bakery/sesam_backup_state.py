@@ -47,6 +47,12 @@ def _get_sesam_backup_state_config(conf: Dict[str, Any]) -> Iterable[str]:
         yield "password=%s" % conf['credentials'][1]
     if "sesam_url" in conf:
         yield "sesam_url=%s" % conf['sesam_url']
+    if "max_workers" in conf:
+        yield "max_workers=%s" % conf['max_workers']
+    if "bulk_tasks" in conf:
+        yield "bulk_tasks=%s" % conf['bulk_tasks']
+    if "state_max_age" in conf:
+        yield "state_max_age=%s" % conf['state_max_age']
 
 
 register.bakery_plugin(
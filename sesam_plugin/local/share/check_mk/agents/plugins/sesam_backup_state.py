@@ -31,19 +31,26 @@ plugin ("pip install requests").
 
 This plugin it will be called by the agent without any arguments.
 """
+import cProfile
 import logging
 import json
+import hashlib
 import os
+import tempfile
 import sys
 import argparse
 import functools
 import time
 import multiprocessing
 import configparser
+import contextlib
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
     from requests.packages.urllib3.exceptions import InsecureRequestWarning
 except ImportError:
     sys.stdout.write("<<<sesam_plugin_info>>>\n"
@@ -57,10 +64,17 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 MK_CONFDIR = os.getenv("MK_CONFDIR") or "/etc/check_mk"
 DEFAULT_CFG_FILE = os.path.join(MK_CONFDIR, "sesam_backup_state.cfg")
 
+MK_VARDIR = os.getenv("MK_VARDIR") or "/var/lib/check_mk_agent"
+DEFAULT_PROFILE_DIR = os.path.join(MK_VARDIR, "sesam_backup_state", "profile")
+DEFAULT_STATE_FILE = os.path.join(MK_VARDIR, "sesam_backup_state", "tasks.json")
+
 DEFAULT_CFG_SECTION = {
     "username": "monitoring",
     "password": "",
     "sesam_url": "https://localhost:11401",
+    "max_workers": "4",
+    "bulk_tasks": "false",
+    "state_max_age": "0",
 }
 
 LOGGER = logging.getLogger(__name__)
@@ -89,6 +103,20 @@ def parse_arguments(argv=None):
                         "--config-file",
                         default=DEFAULT_CFG_FILE,
                         help='''Read config file (default: $MK_CONFDIR/sesam_plugin.cfg)''')
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help='''Write cProfile statistics of the run to
+                        $MK_VARDIR/sesam_backup_state/profile/ (the requests are
+                        sent sequentially, as cProfile only profiles the
+                        calling thread)''')
+    parser.add_argument("--trace-memory",
+                        nargs="?",
+                        type=int,
+                        const=25,
+                        default=0,
+                        metavar="N",
+                        help='''Write the top N (default: 25) memory allocation
+                        sites of the run to $MK_VARDIR/sesam_backup_state/profile/''')
 
     args = parser.parse_args(argv)
 
@@ -154,11 +182,22 @@ class MKSesamClient:
         self._auth = (config["username"], config["password"])
         self._certfile = None
 
+        # One pooled session, sized for the concurrent task requests
+        pool_size = max(1, str2int(config.get("max_workers"), 1))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.auth = self._auth
+        self._session.verify = self._certfile if self._certfile else False
+
     def get_data(self, url):
-        r = requests.get(self.sesam_url + "/sep/api/v2/" + url,
-                         auth=self._auth, verify=self._certfile if self._certfile else False)
+        r = self._session.get(self.sesam_url + "/sep/api/v2/" + url)
         return r.json()
 
+    def close(self):
+        self._session.close()
+
 
 def time_it(func):
     '''Decorator to time the function'''
@@ -192,12 +231,151 @@ def get_backupgroups(client: MKSesamClient):
     return GLOBAL_BACKUPGROUPS
 
 
-def section_backup_state(client: MKSesamClient):
+class TaskState:
+    '''Tasks of the backup groups from earlier runs
+
+    The tasks of a backup group are only requested again if the group as
+    returned by the backupgroups endpoint (including its last result) has
+    changed, or if the stored tasks are older than max_age seconds.
+
+    The group only carries the overall result, so a further failing task
+    of a group that already failed does not change it. The tasks of groups
+    whose result is not OK are therefore always requested.
+    '''
+
+    # results of a group for which its tasks are always requested, see
+    # check_results_sts of the check plugin
+    NOT_OK_RESULTS = ("ERROR", "2", "INFO")
+
+    def __init__(self, path, max_age):
+        self._path = path
+        self._max_age = max_age
+        self._groups = {}
+
+    @staticmethod
+    def fingerprint(group: dict):
+        return hashlib.sha1(json.dumps(group, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def load(self):
+        try:
+            with open(self._path) as state_file:
+                self._groups = json.load(state_file).get("groups", {})
+        except (OSError, ValueError, AttributeError) as exc:
+            LOGGER.info("no usable task state in %s: %s", self._path, exc)
+            self._groups = {}
+
+    def get_tasks(self, group: dict, fingerprint: str):
+        if group.get("resultsSts", "ERROR") in self.NOT_OK_RESULTS:
+            return None
+        entry = self._groups.get(group["name"])
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+        if time.time() - entry.get("timestamp", 0) > self._max_age:
+            return None
+        return entry["tasks"]
+
+    def set_tasks(self, group: dict, fingerprint: str, tasks: list):
+        self._groups[group["name"]] = {
+            "fingerprint": fingerprint,
+            "timestamp": time.time(),
+            "tasks": tasks,
+        }
+
+    def save(self, backupgroups: list):
+        names = {group["name"] for group in backupgroups}
+        groups = {name: entry for name, entry in self._groups.items() if name in names}
+        directory = os.path.dirname(self._path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as tmp:
+                json.dump({"groups": groups}, tmp)
+            os.replace(tmp.name, self._path)
+        except OSError as exc:
+            LOGGER.info("could not save task state to %s: %s", self._path, exc)
+
+
+class BulkTasksNotSupported(Exception):
+    '''The SEP server does not offer the bulk task endpoints'''
+
+
+def get_group_tasks(client: MKSesamClient, group: dict):
+    return client.get_data("backupgroups/%s/tasks" % group["name"])
+
+
+def get_tasks_per_group(client: MKSesamClient, backupgroups: list, max_workers: int = 1):
+    '''One request per backup group'''
+    if max_workers <= 1:
+        return [get_group_tasks(client, group) for group in backupgroups]
+    # executor.map keeps the order of the backup groups
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(functools.partial(get_group_tasks, client), backupgroups))
+
+
+def get_tasks_bulk(client: MKSesamClient, backupgroups: list):
+    '''All tasks and their group relations in two requests, grouped locally'''
+    tasks = client.get_data("tasks")
+    relations = client.get_data("taskgrouprelations")
+    if not isinstance(tasks, list) or not isinstance(relations, list):
+        raise BulkTasksNotSupported("unexpected response of the tasks or taskgrouprelations endpoint")
+
+    tasks_by_name = {}
+    for task in tasks:
+        if "name" not in task:
+            raise BulkTasksNotSupported("tasks without name")
+        tasks_by_name[task["name"]] = task
+
+    tasks_by_group = {}
+    for relation in relations:
+        if "group" not in relation or "task" not in relation:
+            raise BulkTasksNotSupported("task group relations without group or task")
+        if relation["task"] in tasks_by_name:
+            tasks_by_group.setdefault(relation["group"], []).append(tasks_by_name[relation["task"]])
+
+    # Nothing guarantees that the relations refer to the backup groups by
+    # name. Rather than reporting a backup group without tasks, fall back
+    # to the query per backup group.
+    missing = [group["name"] for group in backupgroups if group["name"] not in tasks_by_group]
+    if missing:
+        raise BulkTasksNotSupported("no task group relations for backup group(s) %s" % ", ".join(missing))
+
+    return [tasks_by_group[group["name"]] for group in backupgroups]
+
+
+def get_tasks(client: MKSesamClient, backupgroups: list, max_workers: int = 1, bulk_tasks: bool = False):
+    if not backupgroups:
+        return []
+    if bulk_tasks:
+        try:
+            return get_tasks_bulk(client, backupgroups)
+        except (BulkTasksNotSupported, ValueError, requests.RequestException) as exc:
+            # older SEP versions: fall back to one request per backup group
+            LOGGER.info("bulk task query failed, querying each backup group: %s", exc)
+    return get_tasks_per_group(client, backupgroups, max_workers)
+
+
+def section_backup_state(client: MKSesamClient, max_workers: int = 1, bulk_tasks: bool = False, state: TaskState = None):
     backupgroups = get_backupgroups(client)
     section = Section('backup_state')
     result = []
-    for group in backupgroups:
-        group["tasks"] = client.get_data("backupgroups/%s/tasks" % group["name"])
+
+    fingerprints = [TaskState.fingerprint(group) for group in backupgroups]
+    group_tasks = [None] * len(backupgroups)
+    if state is not None:
+        state.load()
+        group_tasks = [state.get_tasks(group, fingerprint) for group, fingerprint in zip(backupgroups, fingerprints)]
+
+    outdated = [index for index, tasks in enumerate(group_tasks) if tasks is None]
+    LOGGER.info("requesting tasks of %d of %d backup groups", len(outdated), len(backupgroups))
+    fetched = get_tasks(client, [backupgroups[index] for index in outdated], max_workers, bulk_tasks)
+    for index, tasks in zip(outdated, fetched):
+        group_tasks[index] = tasks
+        if state is not None:
+            state.set_tasks(backupgroups[index], fingerprints[index], tasks)
+    if state is not None:
+        state.save(backupgroups)
+
+    for group, tasks in zip(backupgroups, group_tasks):
+        group["tasks"] = tasks
         result.append(group)
     section.append(json.dumps(result))
     section.write()
@@ -220,6 +398,13 @@ def str2bool(v: str):
     return v is not None and v.lower() in ("yes", "true", "t", "1")
 
 
+def str2int(v: str, default: int = 0):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
 def report_exception_to_server(exc, location):
     LOGGER.info("handling exception: %s", exc)
     msg = "Plugin exception in %s: %s" % (location, exc)
@@ -228,9 +413,59 @@ def report_exception_to_server(exc, location):
     sec.write()
 
 
+@contextlib.contextmanager
+def profiling(profile: bool = False, trace_memory: int = 0, directory: str = DEFAULT_PROFILE_DIR):
+    '''Profile the enclosed code and write the results to `directory`
+
+    The cProfile statistics are written in the format of the pstats module,
+    the top `trace_memory` allocation sites as text. Nothing is written to
+    stdout, so the agent output is not affected.
+    '''
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        prefix = os.path.join(directory, "%s-%d" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid()))
+        try:
+            if profiler is not None or snapshot is not None:
+                os.makedirs(directory, exist_ok=True)
+            if profiler is not None:
+                profiler.dump_stats(prefix + ".pstats")
+                LOGGER.info("wrote profile to %s.pstats", prefix)
+            if snapshot is not None:
+                snapshot = snapshot.filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ))
+                with open(prefix + ".memory.txt", "w") as memory_file:
+                    memory_file.write("peak: %d bytes\n" % peak)
+                    for stat in snapshot.statistics("lineno")[:trace_memory]:
+                        memory_file.write("%s\n" % stat)
+                LOGGER.info("wrote memory allocation sites to %s.memory.txt", prefix)
+        except OSError as exc:
+            LOGGER.info("could not write profile to %s: %s", directory, exc)
+
+
 def main():
 
     args = parse_arguments()
+    with profiling(args.profile, args.trace_memory):
+        run(args)
+
+
+def run(args):
     config: dict = get_config(args.config_file)
 
     if not config["sesam_url"]:
@@ -243,11 +478,19 @@ def main():
         report_exception_to_server(exc, "main")
         sys.exit(1)
 
+    # cProfile only sees the main thread, so profiled runs are sequential
+    _max_workers = 1 if args.profile else str2int(config["max_workers"], 1)
+    _bulk_tasks = str2bool(config["bulk_tasks"])
+    _state_max_age = str2int(config["state_max_age"], 0)
+    _state = TaskState(DEFAULT_STATE_FILE, _state_max_age) if _state_max_age > 0 else None
+
     try:
-        section_backup_state(client)
+        section_backup_state(client, max_workers=_max_workers, bulk_tasks=_bulk_tasks, state=_state)
     except () if DEBUG else Exception as exc:
         report_exception_to_server(exc, "get data")
         sys.exit(1)
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
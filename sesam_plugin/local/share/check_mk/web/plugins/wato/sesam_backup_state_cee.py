@@ -37,6 +37,8 @@ from cmk.gui.valuespec import (
     TextAscii,
     Tuple,
     FixedValue,
+    Integer,
+    DropdownChoice,
 )
 
 
@@ -75,7 +77,36 @@ def _valuespec_agent_config_sesam_backup_state_plugin():
                          allow_empty=False,
                          default_value="https://localhost:11401"
                      )),
-                    
+                    ("max_workers",
+                     Integer(
+                         title=_("Number of parallel API requests"),
+                         help=_("Number of backup groups whose tasks are requested at the same time. "
+                                "Use 1 to query the backup groups sequentially."),
+                         minvalue=1,
+                         default_value=4,
+                     )),
+                    ("bulk_tasks",
+                     DropdownChoice(
+                         title=_("Task query"),
+                         help=_("Query all tasks at once and assign them to their backup groups. "
+                                "If the SEP server does not support this, the tasks of each backup "
+                                "group are requested separately, as they are if a backup group has no "
+                                "task relations."),
+                         choices=[
+                             (True, _("Query all tasks at once")),
+                             (False, _("Query the tasks of each backup group")),
+                         ],
+                         default_value=False,
+                     )),
+                    ("state_max_age",
+                     Age(
+                         title=_("Reuse tasks of unchanged backup groups for"),
+                         help=_("The tasks of a backup group are only requested again if the backup group "
+                                "or its last result changed, or after this time. The tasks of backup groups "
+                                "whose last result is not OK are requested on every run. Use 0 to request "
+                                "the tasks of all backup groups on every run."),
+                         default_value=0,
+                     )),
                 ],
                 optional_keys=False,
             ),